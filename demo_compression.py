@@ -16,10 +16,13 @@ REQUIREMENTS:
 - All dependencies installed via pip install -r requirements.txt
 """
 
-import json
+import asyncio
 import os
 import time
-from typing import Dict, List, Set, Any
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Any
+import ijson
 from termcolor import colored
 from datetime import datetime
 from dotenv import load_dotenv
@@ -31,23 +34,92 @@ load_dotenv()
 import sys
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+import json_codec
 from knowledge_graph_service import KnowledgeGraphService
+from models import ToolSummary
 
+def _use_color() -> bool:
+    """Same rules as termcolor: env overrides first, then whether stdout is a terminal"""
+    if "ANSI_COLORS_DISABLED" in os.environ or "NO_COLOR" in os.environ:
+        return False
+    if "FORCE_COLOR" in os.environ:
+        return True
+    return sys.stdout.isatty()
+
+# Precomputed ANSI escapes for per-entry progress lines, avoiding a colored() call per line;
+# empty when output isn't colored, so piped output carries no escape codes
+class C:
+    _on = _use_color()
+    RED = "\033[31m" if _on else ""
+    GREEN = "\033[32m" if _on else ""
+    YELLOW = "\033[33m" if _on else ""
+    BLUE = "\033[34m" if _on else ""
+    MAGENTA = "\033[35m" if _on else ""
+    CYAN = "\033[36m" if _on else ""
+    RESET = "\033[0m" if _on else ""
+
+# Number of trace entries planned and written per Neo4j batch during Phase 1
+TRACE_BATCH_SIZE = 500
+
+# Maximum number of summary requests in flight at once during Phase 2
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "20"))
+
+# OpenAI requests-per-minute budget for Phase 2 summaries
+SUMMARY_RPM = int(os.getenv("SUMMARY_RPM", "500"))
+
+
+class AsyncRateLimiter:
+    """
+    Token-bucket limiter allowing max_rate acquisitions per time_period seconds.
+    Only waits once the bucket is empty, so short bursts run at full speed.
+    """
+
+    def __init__(self, max_rate: float, time_period: float = 60.0):
+        self.max_rate = max_rate
+        self.rate = max_rate / time_period
+        self._tokens = float(max_rate)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
 
-def load_tool_execution_trace(file_path: str) -> List[Dict[str, Any]]:
-    """Load tool execution trace from JSON file"""
+    async def __aenter__(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.max_rate, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return self
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+def iter_tool_execution_trace(file_path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Stream tool executions from a JSON array trace file, one entry at a time.
+    A missing or unreadable file yields nothing; a parse error part-way through
+    is reported and re-raised so the run aborts instead of ingesting a prefix.
+    """
     try:
-        with open(file_path, 'r') as f:
-            data = json.load(f)
-        print(colored(f"Loaded {len(data)} tool executions from {file_path}", "green"))
-        return data
-    except Exception as e:
+        f = open(file_path, 'rb')
+    except OSError as e:
         print(colored(f"Error loading trace file: {str(e)}", "red"))
-        return []
+        return
+    with f:
+        try:
+            yield from ijson.items(f, 'item', use_float=True)
+        except ijson.JSONError as e:
+            print(colored(f"Error parsing trace file {file_path}: {str(e)}", "red"))
+            raise
 
 
-def check_environment():
-    """Check if all required environment variables are set"""
+def check_environment() -> Optional[Dict[str, str]]:
+    """
+    Check if all required environment variables are set
+    Returns the resolved {name: value} mapping, or None if any are missing
+    """
     required_vars = {
         "NEO4J_URI": "Neo4j database URI",
         "NEO4J_USERNAME": "Neo4j username", 
@@ -55,10 +127,8 @@ def check_environment():
         "OPENAI_API_KEY": "OpenAI API key"
     }
     
-    missing = []
-    for var, description in required_vars.items():
-        if not os.getenv(var):
-            missing.append(f"{var} ({description})")
+    env = {var: os.environ.get(var) for var in required_vars}
+    missing = [f"{var} ({description})" for var, description in required_vars.items() if not env[var]]
     
     if missing:
         print(colored("❌ Missing required environment variables:", "red"))
@@ -69,63 +139,129 @@ def check_environment():
         print(colored("NEO4J_USERNAME=neo4j", "yellow"))
         print(colored("NEO4J_PASSWORD=your-password-here", "yellow"))
         print(colored("OPENAI_API_KEY=sk-your-openai-api-key-here", "yellow"))
-        return False
+        return None
     
-    return True
+    return env
 
 
-def test_services():
-    """Test connections to Neo4j and OpenAI services"""
-    print(colored("Testing service connections...", "blue"))
-    
-    # Test Neo4j connection
+def _test_neo4j() -> Tuple[bool, str]:
+    """Ping Neo4j, returning (ok, message)"""
     try:
         from neo4j_service import Neo4jService
         neo4j_service = Neo4jService()
         neo4j_service.test_connection()
-        print(colored("✓ Neo4j connection successful", "green"))
         neo4j_service.close()
+        return True, "✓ Neo4j connection successful"
     except Exception as e:
-        print(colored(f"✗ Neo4j connection failed: {str(e)}", "red"))
-        return False
-    
-    # Test OpenAI connection
+        return False, f"✗ Neo4j connection failed: {str(e)}"
+
+
+def _test_openai() -> Tuple[bool, str]:
+    """Ping OpenAI, returning (ok, message)"""
     try:
         from llm_service import LLMService, Message
         llm_service = LLMService()
         test_messages = [Message(role="user", content="Say 'test successful'")]
         response = llm_service.generate(test_messages)
-        print(colored("✓ OpenAI connection successful", "green"))
-        print(colored(f"  Response: {response[:50]}...", "cyan"))
+        return True, f"✓ OpenAI connection successful\n  Response: {response[:50]}..."
     except Exception as e:
-        print(colored(f"✗ OpenAI connection failed: {str(e)}", "red"))
-        return False
+        return False, f"✗ OpenAI connection failed: {str(e)}"
+
+
+def test_services():
+    """Test connections to Neo4j and OpenAI services concurrently"""
+    print(colored("Testing service connections...", "blue"))
     
-    return True
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [executor.submit(_test_neo4j), executor.submit(_test_openai)]
+        results = [future.result() for future in futures]
+    
+    for ok, message in results:
+        print(colored(message, "green" if ok else "red"))
+    
+    return all(ok for ok, _ in results)
 
-def run_entry_with_cache(kg_service: KnowledgeGraphService, tool_entry: Dict[str, Any], token_counter) -> Dict[str, Any]:
+def ingest_trace(kg_service: KnowledgeGraphService, trace_entries: Iterable[Dict[str, Any]], token_counter,
+                 batch_size: int = TRACE_BATCH_SIZE) -> Dict[str, Any]:
     """
-    Try to reuse a cached result for READ-like actions.
-    If cache hit -> return {"reused": True, "tool_id": <TR-id>, "avoided_tokens": <int>}
-    If miss -> add a new tool result and return {"reused": False, "tool_id": "TR-x", "avoided_tokens": 0}
+    Stream a trace into the knowledge graph in batches of batch_size entries,
+    so only one batch is held in memory at a time.
+    Returns {"tool_ids": [...new TR-ids...], "cache_hits": <int>, "avoided_tokens": <int>, "processed": <int>}
     """
-    action_type = tool_entry.get("action_type", "unknown")
-    action = tool_entry.get("action", {}) or {}
-
-    # only try reuse for reads
-    op_type = kg_service._classify_op(action_type, action)
-    if op_type == "read":
-        cached = kg_service.preflight(action_type, action)
-        if cached:
-            # estimate tokens we would have added if we *did* store this tool result
-            would_store = json.dumps(tool_entry, indent=2)
-            avoided = token_counter.count_tokens(would_store)
-            print(colored(kg_service.render_reused_result(cached), "magenta"))
-            return {"reused": True, "tool_id": cached["tool_id"], "avoided_tokens": avoided}
-
-    # miss (or write): store a new node
-    tool_id = kg_service.add_tool_result(tool_entry)
-    return {"reused": False, "tool_id": tool_id, "avoided_tokens": 0}
+    totals = {"tool_ids": [], "cache_hits": 0, "avoided_tokens": 0, "processed": 0}
+    entries = iter(trace_entries)
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            break
+        print(f"Processing tools {totals['processed']+1}-{totals['processed']+len(batch)}...")
+        res = ingest_batch(kg_service, batch, token_counter)
+        totals["tool_ids"].extend(res["tool_ids"])
+        totals["cache_hits"] += res["cache_hits"]
+        totals["avoided_tokens"] += res["avoided_tokens"]
+        totals["processed"] += len(batch)
+    return totals
+
+def ingest_batch(kg_service: KnowledgeGraphService, trace_data: List[Dict[str, Any]], token_counter) -> Dict[str, Any]:
+    """
+    Add a batch of trace entries to the knowledge graph, reusing cached results for READ-like actions.
+    Pass 1 decides hit/miss for every entry (in trace order), pass 2 stores all
+    misses in a single Neo4j transaction, then cache hits are reported.
+    Returns {"tool_ids": [...new TR-ids...], "cache_hits": <int>, "avoided_tokens": <int>}
+    """
+    plan, fields = kg_service.plan_reuse(trace_data)
+    miss_indices = [i for i, cached in enumerate(plan) if cached is None]
+
+    tool_ids = kg_service.add_tool_results_bulk([trace_data[i] for i in miss_indices],
+                                                [fields[i] for i in miss_indices])
+    stored = dict(zip(miss_indices, tool_ids))
+
+    would_store = []
+    reused_lines = []
+    for i, cached in enumerate(plan):
+        if cached is None:
+            continue
+        if "source_index" in cached:
+            # repeat of an entry stored earlier in this same batch
+            action_type = trace_data[i].get("action_type", "unknown")
+            cached = {"tool_id": stored[cached["source_index"]], "text": f"Reused prior result for {action_type}"}
+        reused_lines.append(f"{C.MAGENTA}{kg_service.render_reused_result(cached)}{C.RESET}")
+        would_store.append(json_codec.dumps(trace_data[i]))
+    if reused_lines:
+        # one write for the whole batch instead of one per cache hit
+        print("\n".join(reused_lines))
+
+    # estimate tokens we would have added if we *did* store these tool results
+    avoided_tokens = sum(token_counter.count_tokens_batch(would_store, num_threads=os.cpu_count() or 1))
+
+    return {"tool_ids": tool_ids, "cache_hits": len(would_store), "avoided_tokens": avoided_tokens}
+
+async def summarize_all(kg_service: KnowledgeGraphService, tool_ids: List[str],
+                        max_concurrency: Optional[int] = None, rpm: Optional[int] = None) -> List[Any]:
+    """
+    Generate summaries for all tool results concurrently.
+    A semaphore caps the number of in-flight LLM requests and a token bucket
+    keeps them under the requests-per-minute budget; results are returned
+    in the same order as tool_ids (failed summaries are reported and come back as None).
+    """
+    sem = asyncio.Semaphore(max_concurrency or SUMMARY_CONCURRENCY)
+    limiter = AsyncRateLimiter(rpm or SUMMARY_RPM, 60)
+    total = len(tool_ids)
+
+    async def summarize_one(i: int, tool_id: str):
+        try:
+            async with sem, limiter:
+                summary = await kg_service.agenerate_summary(tool_id)
+        except Exception as e:
+            print(f"{C.RED}  [{i+1}/{total}] Failed to generate summary for {tool_id}: {e}{C.RESET}")
+            return None
+        if summary:
+            print(f"{C.GREEN}  [{i+1}/{total}] {tool_id}: {summary.summary_content[:80]}...{C.RESET}")
+        else:
+            print(f"{C.RED}  [{i+1}/{total}] Failed to generate summary for {tool_id}{C.RESET}")
+        return summary
+
+    return await asyncio.gather(*(summarize_one(i, tool_id) for i, tool_id in enumerate(tool_ids)))
 
 def simulate_agent_workflow():
     """Simulate an agent workflow with memory management"""
@@ -134,7 +270,8 @@ def simulate_agent_workflow():
     print()
     
     # Check environment
-    if not check_environment():
+    env = check_environment()
+    if not env:
         print(colored("Please fix environment setup and try again.", "red"))
         return
     
@@ -148,49 +285,42 @@ def simulate_agent_workflow():
     print(colored(f"Initializing workflow: {workflow_id}", "blue"))
     
     try:
-        api_key = os.getenv("OPENAI_API_KEY")
-        kg_service = KnowledgeGraphService(workflow_id, api_key)
+        kg_service = KnowledgeGraphService(workflow_id, env["OPENAI_API_KEY"])
         print(colored("✓ Knowledge graph service initialized", "green"))
     except Exception as e:
         print(colored(f"✗ Failed to initialize knowledge graph service: {str(e)}", "red"))
         return
     
     try:
-        # Load tool execution data
-        trace_data = load_tool_execution_trace("examples/tool_execution_trace.json")
-        if not trace_data:
-            print(colored("No trace data to process", "red"))
-            return
-        
         print()
         print(colored("=== PHASE 1: ADDING TOOL RESULTS ===", "cyan", attrs=['bold']))
         
-        # Add all tool results to the knowledge graph
-        tool_ids = []
-        cache_hits = 0
-        cache_avoided_tokens = 0
+        # Stream tool execution data into the knowledge graph
 
         # a local token counter for avoided-tokens estimate
         from token_counter import TokenCounter
         _demo_token_counter = TokenCounter()
 
-        for i, tool_entry in enumerate(trace_data):
-            print(f"Processing tool {i+1}/{len(trace_data)}...")
-            res = run_entry_with_cache(kg_service, tool_entry, _demo_token_counter)
-            if res["reused"]:
-                cache_hits += 1
-                cache_avoided_tokens += res["avoided_tokens"]
-            else:
-                tool_ids.append(res["tool_id"])
-            time.sleep(0.05)
+        trace_file = "examples/tool_execution_trace.json"
+        res = ingest_trace(kg_service, iter_tool_execution_trace(trace_file), _demo_token_counter)
+        if not res["processed"]:
+            print(colored("No trace data to process", "red"))
+            return
+        print(colored(f"Loaded {res['processed']} tool executions from {trace_file}", "green"))
+        tool_ids = res["tool_ids"]
+        cache_hits = res["cache_hits"]
+        cache_avoided_tokens = res["avoided_tokens"]
         
         print()
         print(colored("=== INITIAL DASHBOARD (before summaries) ===", "cyan"))
-        dashboard = kg_service.generate_dashboard()
+        # Tool results don't change after Phase 1, so fetch them once and
+        # reuse them for every dashboard render below
+        all_tools = kg_service.get_all_tool_results()
+        dashboard = kg_service.generate_dashboard(tool_results=all_tools)
         print(dashboard)
         
-        # Right before PHASE 2
-        tool_ids = [tr.tool_id for tr in kg_service.get_all_tool_results()]
+        # Right before PHASE 2: reads purged by later writes are already gone from all_tools
+        tool_ids = [tr.tool_id for tr in all_tools]
 
         print()
         print(colored("=== PHASE 2: GENERATING SUMMARIES ===", "cyan", attrs=['bold']))
@@ -199,21 +329,14 @@ def simulate_agent_workflow():
         print(colored("# This is using REAL OpenAI API calls to generate intelligent summaries!", "yellow"))
         print()
         
-        # Generate summaries for all tool results
-        summaries = []
-        for i, tool_id in enumerate(tool_ids):
-            print(f"Generating summary for {tool_id} ({i+1}/{len(tool_ids)})...")
-            summary = kg_service.generate_summary(tool_id)
-            if summary:
-                summaries.append(summary)
-                print(colored(f"  Summary: {summary.summary_content[:80]}...", "green"))
-            else:
-                print(colored(f"  Failed to generate summary for {tool_id}", "red"))
-            time.sleep(0.5)  # Small delay for API rate limiting
+        # Generate summaries for all tool results concurrently
+        print(f"Generating summaries for {len(tool_ids)} tools (up to {SUMMARY_CONCURRENCY} in flight)...")
+        results = asyncio.run(summarize_all(kg_service, tool_ids))
+        summaries = [summary for summary in results if isinstance(summary, ToolSummary)]
         
         print()
         print(colored("=== DASHBOARD WITH SUMMARIES ===", "cyan"))
-        dashboard = kg_service.generate_dashboard()
+        dashboard = kg_service.generate_dashboard(tool_results=all_tools)
         print(dashboard)
         
         print()
@@ -221,23 +344,22 @@ def simulate_agent_workflow():
         
         # Demonstrate compression of related tools
         # Group AWS-related commands
-        aws_tools = [tid for tid in tool_ids[:6]]  # First 6 are AWS commands
+        aws_tools = tool_ids[:6]  # First 6 are AWS commands
         print(colored(f"Compressing AWS-related tools: {', '.join(aws_tools)}", "yellow"))
         
-        if kg_service.compress_tool_results(aws_tools):
-            print(colored("✓ AWS tools compressed successfully", "green"))
-        else:
-            print(colored("✗ Failed to compress AWS tools", "red"))
-        
         # Group file operation tools
-        file_tools = [tid for tid in tool_ids[6:]]  # Rest are file operations
+        file_tools = tool_ids[6:]  # Rest are file operations
         if file_tools:
             print(colored(f"Compressing file operation tools: {', '.join(file_tools)}", "yellow"))
-            
-            if kg_service.compress_tool_results(file_tools):
+        
+        # Both groups are written to Neo4j in a single transaction
+        groups = [aws_tools, file_tools] if file_tools else [aws_tools]
+        if kg_service.compress_tool_results_multi(groups):
+            print(colored("✓ AWS tools compressed successfully", "green"))
+            if file_tools:
                 print(colored("✓ File operation tools compressed successfully", "green"))
-            else:
-                print(colored("✗ Failed to compress file operation tools", "red"))
+        else:
+            print(colored("✗ Failed to compress tool groups", "red"))
         
         print()
         print(colored("=== DASHBOARD WITH COMPRESSION ===", "cyan"))
@@ -258,22 +380,29 @@ def simulate_agent_workflow():
                 "timestamp": datetime.now().isoformat()
             }
         
-        dashboard = kg_service.generate_dashboard(compressed_tool_groups=compressed_groups)
+        # The groups don't change for the rest of the demo, so collect their tool IDs once
+        compressed_ids = kg_service.compressed_ids(compressed_groups)
+        dashboard = kg_service.generate_dashboard(
+            compressed_tool_groups=compressed_groups,
+            tool_results=all_tools,
+            compressed_tool_ids=compressed_ids
+        )
         print(dashboard)
         
         print()
         print(colored("=== PHASE 4: DEMONSTRATING EXPANSION ===", "cyan", attrs=['bold']))
         
         # Demonstrate expansion of specific tools
-        expanded_tools = {aws_tools[0]}  # Expand first AWS tool
-        if file_tools:
-            expanded_tools.add(file_tools[0])  # Expand first file tool
+        # Expand first AWS tool, and first file tool if any
+        expanded_tools = frozenset([tool_ids[0], tool_ids[6]] if file_tools else [tool_ids[0]])
             
         print(colored(f"Expanding tools for detailed view: {', '.join(expanded_tools)}", "yellow"))
         
         dashboard = kg_service.generate_dashboard(
             compressed_tool_groups=compressed_groups,
-            expanded_tools=expanded_tools
+            expanded_tools=expanded_tools,
+            tool_results=all_tools,
+            compressed_tool_ids=compressed_ids
         )
         print(dashboard)
         
@@ -281,46 +410,51 @@ def simulate_agent_workflow():
         print(colored("=== PHASE 5: RETRIEVING INDIVIDUAL SUMMARIES ===", "cyan", attrs=['bold']))
         
         # Show individual tool summaries with salient data
-        for tool_id in tool_ids[:3]:  # Show first 3 as examples
-            print(f"\n--- {tool_id} ---")
-            summary_with_data = kg_service.retrieve_tool_result_with_salient_data(tool_id)
+        # Show first 3 as examples, fetched in a single Neo4j query
+        lines = []
+        for tool_id, summary_with_data in kg_service.retrieve_tool_results_with_salient_data(tool_ids[:3]).items():
+            lines.append(f"\n--- {tool_id} ---")
             if summary_with_data:
-                print(colored(f"Summary with salient data: {summary_with_data}", "green"))
+                lines.append(colored(f"Summary with salient data: {summary_with_data}", "green"))
             else:
-                print(colored("No summary available", "red"))
+                lines.append(colored("No summary available", "red"))
+        print("\n".join(lines))
         
         print()
         print(colored("=== FINAL STATISTICS ===", "cyan", attrs=['bold']))
         
-        # Show final statistics
-        all_tools = kg_service.get_all_tool_results()
+        # Show final statistics (compression adds no tool results, so all_tools is still current)
         total_tokens = sum(tool.token_count for tool in all_tools)
         
-        print(f"Total tools processed: {len(all_tools)}")
-        print(f"Total tokens: {total_tokens:,}")
-        print(f"Summaries generated: {len(summaries)}")
-        print(f"Compression groups created: {len(compressed_groups)}")
-
-        print(f"Cache hits (initial pass): {cache_hits}")
-        print(f"Cache avoided tokens (initial): {cache_avoided_tokens:,}")
+        lines = [
+            f"Total tools processed: {len(all_tools)}",
+            f"Total tokens: {total_tokens:,}",
+            f"Summaries generated: {len(summaries)}",
+            f"Compression groups created: {len(compressed_groups)}",
+            f"Cache hits (initial pass): {cache_hits}",
+            f"Cache avoided tokens (initial): {cache_avoided_tokens:,}",
+        ]
         
         # Calculate compression ratio
         if summaries:
             summary_tokens = sum(s.token_count for s in summaries)
             compression_ratio = (total_tokens - summary_tokens) / total_tokens * 100
-            print(f"Compression ratio: {compression_ratio:.1f}%")
-            print(f"Token savings: {total_tokens - summary_tokens:,} tokens")
+            lines.append(f"Compression ratio: {compression_ratio:.1f}%")
+            lines.append(f"Token savings: {total_tokens - summary_tokens:,} tokens")
         
-        print()
-        print(colored("=== DEMO COMPLETE ===", "cyan", attrs=['bold']))
-        print(colored("This demonstrates how the agent manages memory by:", "white"))
-        print(colored("1. Adding tool results as they're executed", "white"))
-        print(colored("2. Generating summaries in parallel with planning", "white"))
-        print(colored("3. Compressing related tools to save memory", "white"))
-        print(colored("4. Expanding specific tools when details are needed", "white"))
-        print(colored("5. Maintaining a dashboard view of all operations", "white"))
-        print()
-        print(colored("✨ All operations used REAL Neo4j and OpenAI services!", "green", attrs=['bold']))
+        lines += [
+            "",
+            colored("=== DEMO COMPLETE ===", "cyan", attrs=['bold']),
+            colored("This demonstrates how the agent manages memory by:", "white"),
+            colored("1. Adding tool results as they're executed", "white"),
+            colored("2. Generating summaries in parallel with planning", "white"),
+            colored("3. Compressing related tools to save memory", "white"),
+            colored("4. Expanding specific tools when details are needed", "white"),
+            colored("5. Maintaining a dashboard view of all operations", "white"),
+            "",
+            colored("✨ All operations used REAL Neo4j and OpenAI services!", "green", attrs=['bold']),
+        ]
+        print("\n".join(lines))
         
     except Exception as e:
         print(colored(f"Error during demo: {str(e)}", "red"))
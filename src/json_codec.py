@@ -0,0 +1,82 @@
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """
+    Serialize an object to a compact JSON string.
+
+    Uses orjson when available (C implementation, emits UTF-8 directly)
+    and falls back to the stdlib encoder with compact separators.
+
+    Args:
+        obj (Any): JSON-serializable object
+        indent (bool): Pretty-print with two-space indentation
+
+    Returns:
+        str: JSON text
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, option=option).decode()
+    if indent:
+        return json.dumps(obj, indent=2)
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Parse JSON text or bytes.
+
+    Args:
+        data (Union[str, bytes]): JSON document
+
+    Returns:
+        Any: Parsed object
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_canonical(obj: Any) -> bytes:
+    """
+    Serialize an object to compact, key-sorted JSON bytes for hashing.
+
+    Output is byte-identical to ``json.dumps(obj, sort_keys=True,
+    separators=(",", ":"))`` so digests stay stable across encoders; orjson
+    is used when its output is pure ASCII without DEL (the stdlib escapes
+    non-ASCII and 0x7f) and the object holds no floats (the encoders format
+    exponents differently).
+
+    Args:
+        obj (Any): JSON-serializable object with string keys
+
+    Returns:
+        bytes: Canonical JSON encoding
+    """
+    if orjson is not None and not _contains_float(obj):
+        try:
+            data = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            data = None
+        if data is not None and data.isascii() and b"\x7f" not in data:
+            return data
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+def _contains_float(obj: Any) -> bool:
+    if isinstance(obj, float):
+        return True
+    if isinstance(obj, dict):
+        return any(_contains_float(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_contains_float(value) for value in obj)
+    return False
@@ -1,16 +1,149 @@
-import json
+import asyncio
+import functools
 import os
-from typing import Dict, List, Optional, Tuple, Any, Set
-from datetime import datetime
-from termcolor import colored
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from typing import Dict, FrozenSet, Iterator, List, Optional, Tuple, Any, Set
+from datetime import datetime, timezone
 
 from neo4j_service import Neo4jService
 from models import RelationshipType, ToolResult, ToolSummary
 from token_counter import TokenCounter
 from llm_service import LLMService, Message
 from tool_summary_prompts import TOOL_SUMMARY_PROMPT
+import json_codec
+from log_utils import get_logger
+from write_markers import is_write_command
 import hashlib
 
+logger = get_logger(__name__)
+
+TOOL_RESULT_PREFIX = "tool_result_"
+SUMMARY_PREFIX = "summary_"
+# Tool result node IDs are this prefix followed by the tool counter
+TOOL_RESULT_ID_PREFIX = TOOL_RESULT_PREFIX + "TR-"
+
+
+@functools.lru_cache(maxsize=4096)
+def _tr_key(tool_id: str) -> str:
+    """Node ID of a tool result (e.g. "TR-5" -> "tool_result_TR-5")"""
+    return TOOL_RESULT_PREFIX + tool_id
+
+
+@functools.lru_cache(maxsize=4096)
+def _sum_key(tool_id: str) -> str:
+    """Node ID of a tool result's summary (e.g. "TR-5" -> "summary_TR-5")"""
+    return SUMMARY_PREFIX + tool_id
+
+
+def _tool_id_from_key(node_id: str) -> str:
+    """Tool ID of a tool result node ID (e.g. "tool_result_TR-5" -> "TR-5")"""
+    return node_id[len(TOOL_RESULT_PREFIX):]
+
+
+# Header, input and result lines of an expanded dashboard row
+DASHBOARD_ROW_TEMPLATE = "[{tool_id}] {action_type} - {status} ({tokens:,} tokens){warning}\nInput: {action_json}\nResult: {result}"
+
+def _format_expanded_row(tool: ToolResult) -> str:
+    """Format the full dashboard view of a tool result as one block of lines"""
+    status = tool.status.upper()
+    row = DASHBOARD_ROW_TEMPLATE.format(
+        tool_id=tool.tool_id,
+        action_type=tool.action_type,
+        status=status,
+        tokens=tool.token_count,
+        warning=" ⚠️" if tool.status == "error" or tool.token_count > 5000 else "",
+        action_json=json_codec.dumps(tool.action),
+        result=status.lower()
+    )
+    
+    result = tool.result
+    output = result.get("output", "")
+    if output:
+        row += f"\nOutput: {output}"
+    error = result.get("error", "")
+    if error:
+        row += f"\nError: {error}"
+    return row
+
+
+def _now_iso() -> str:
+    """Current time in the canonical stored timestamp format (see _canonical_ts)"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+_CANONICAL_TS_RE = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6}Z")
+# UTC "Z" timestamps with whole seconds or microseconds, e.g. the trace's "2024-01-15T10:30:00Z"
+_ISO_Z_RE = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d{6})?Z")
+
+
+def _parse_iso_z(ts: str) -> datetime:
+    """
+    Parse an ISO-8601 timestamp into a datetime.
+
+    "YYYY-MM-DDTHH:MM:SS[.ffffff]Z" is read by slicing its fixed fields;
+    any other shape goes through datetime.fromisoformat.
+
+    Raises:
+        ValueError: If the timestamp is not valid ISO-8601
+    """
+    if _ISO_Z_RE.fullmatch(ts):
+        return datetime(
+            int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+            int(ts[11:13]), int(ts[14:16]), int(ts[17:19]),
+            int(ts[20:26]) if len(ts) == 27 else 0,
+            tzinfo=timezone.utc,
+        )
+    return datetime.fromisoformat(ts.replace("Z", "+00:00"))
+
+
+def _canonical_ts(ts: Optional[str]) -> str:
+    """
+    Normalize an ISO-8601 timestamp to UTC with fixed-width microseconds
+    ("2024-01-15T10:30:00.000000Z"), so stored timestamps order correctly as
+    plain strings. Naive timestamps are taken as local time; unparsable ones
+    become "" (older than everything).
+    """
+    # Timestamps this service wrote are already canonical: no parse needed
+    if isinstance(ts, str) and _CANONICAL_TS_RE.fullmatch(ts):
+        return ts
+    try:
+        dt = _parse_iso_z(ts)
+    except (AttributeError, TypeError, ValueError):
+        return ""
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+# Action types whose cached results are purged when a resource they read is written
+_READ_TYPES = frozenset({
+    "read_file_contents", "query_codebase",
+    "search_documentation", "search_internet",
+    "retrieve_integration_methods", "execute_command",
+})
+# Action types that always mutate their resources
+_WRITE_ACTION_TYPES = frozenset({"create_file", "modify_code", "delete_file"})
+# Action types whose resource is their file_path
+_FILE_PATH_ACTIONS = frozenset({"create_file", "delete_file", "read_file_contents", "run_file"})
+# Action types that can map to resource ids; every other type has none
+_RESOURCE_ACTIONS = _FILE_PATH_ACTIONS | {
+    "modify_code", "execute_command", "query_codebase", "search_documentation", "search_internet",
+}
+
+# Maximum number of summaries generated concurrently when a compression needs them
+SUMMARY_WORKERS = 8
+
+# Maximum number of reuse hits remembered in-process by tool_key
+PREFLIGHT_CACHE_SIZE = 1024
+
+# Maximum number of texts whose token counts are remembered in-process
+TOKEN_CACHE_SIZE = 4096
+
+# (action_type, normalized action, tool_key, resource_ids, op_type) of one entry
+CacheFields = Tuple[str, Dict[str, Any], str, List[str], str]
+
 class KnowledgeGraphService:
     """Service for managing tool results using a knowledge graph approach"""
     
@@ -26,96 +159,349 @@ class KnowledgeGraphService:
         self.neo4j_service = Neo4jService()
         self.token_counter = TokenCounter()
         self.llm_service = LLMService(api_key=api_key)
+        # Token counts keyed by the counted text (LRU, TOKEN_CACHE_SIZE entries), so
+        # re-serialized content that was already counted (e.g. on every dashboard refresh)
+        # is not re-tokenized. Summaries count tokens from worker threads, so every
+        # access goes through _token_cache_lock; tokenizing happens outside it
+        self._token_cache: "OrderedDict[str, int]" = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+        # Node lookups memoized for the duration of one dashboard render (None when inactive)
+        self._node_cache: Optional[Dict[str, Optional[Dict]]] = None
+        # Recent reuse hits by tool_key (LRU), and the latest write timestamp seen
+        # by this process per resource, which invalidates hits older than it
+        self._preflight_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._resource_write_ts: Dict[str, str] = {}
+        # Last-write timestamp of each resource marker this process wrote, so
+        # unchanged markers (same-timestamp writes, retries) aren't rewritten
+        self._written_marker_ts: Dict[str, str] = {}
+        # Bumped on every write this process stores; remembered hits checked at
+        # the current epoch are known valid without re-checking their resources
+        self._write_epoch = 0
         # Initialize tool counter based on existing tools in the graph
         self.tool_counter = self._get_next_tool_counter()
+        # Reuse lookups and purges filter on node properties, which older nodes lack
+        self._backfill_tool_result_properties()
         
     def _get_next_tool_counter(self) -> int:
-        """Get the next tool counter based on existing tools in the graph"""
+        """
+        Get the next tool counter based on existing tools in the graph
+        
+        Read from the workflow's counter node; workflows created before the
+        counter existed fall back to the highest tool ID in the graph.
+        """
         try:
-            nodes = self.neo4j_service.get_all_nodes(self.workflow_id)
-            max_counter = 0
-            
-            for node in nodes:
-                if node["id"].startswith("tool_result_TR-"):
-                    # Extract counter from TR-X format
-                    tool_id = node["id"].replace("tool_result_", "")
-                    counter = int(tool_id.split("-")[1])
-                    max_counter = max(max_counter, counter)
-                    
-            return max_counter
+            counter = self.neo4j_service.get_tool_counter(self.workflow_id)
+            if counter is not None:
+                return counter
+            return self.neo4j_service.get_max_counter_by_prefix(self.workflow_id, TOOL_RESULT_ID_PREFIX)
         except Exception as e:
-            print(colored(f"Warning: Could not determine next tool counter: {str(e)}", "yellow"))
+            logger.warning("Warning: Could not determine next tool counter: %s", e)
             return 0
         
+    def _backfill_tool_result_properties(self) -> int:
+        """
+        Add the top-level properties (tool_key, status, resource_ids, timestamp, ...)
+        to tool-result nodes stored before they existed, deriving them from the
+        node's content, so those nodes take part in reuse lookups and stale-read purges
+        
+        Returns:
+            int: Number of nodes backfilled
+        """
+        try:
+            legacy = self.neo4j_service.get_nodes_missing_property(
+                self.workflow_id, TOOL_RESULT_ID_PREFIX, "tool_key"
+            )
+        except Exception as e:
+            logger.warning("Warning: Could not check for tool results to backfill: %s", e)
+            return 0
+
+        nodes = []
+        for node in legacy:
+            try:
+                entry = json_codec.loads(node.get("content") or "{}")
+            except Exception:
+                continue
+            action_type, action_norm, tool_key, resource_ids, op_type = self._cache_fields(entry)
+            result = entry.get("result", {}) or {}
+            tool_result = ToolResult(
+                tool_id=_tool_id_from_key(node["id"]),
+                action_type=action_type,
+                action=action_norm,
+                result=result,
+                timestamp=entry.get("timestamp") or "",
+                token_count=self._count_tokens_cached(node["content"]),
+                status=result.get("status", "unknown"),
+            )
+            cache = {"tool_key": tool_key, "resource_ids": resource_ids, "op_type": op_type}
+            row = self._tool_result_node(tool_result, node["content"], cache)
+            row["summary"] = node.get("summary") or row["summary"]
+            nodes.append(row)
+
+        if nodes:
+            self.neo4j_service.update_nodes_bulk(nodes, workflow_id=self.workflow_id)
+            logger.info("Backfilled node properties of %s tool results", len(nodes))
+        return len(nodes)
+
     def close(self):
         """Close Neo4j connection"""
         self.neo4j_service.close()
         
-    def add_tool_result(self, knowledge_entry: Dict[str, Any]) -> str:
+    def add_tool_result(self, knowledge_entry: Dict[str, Any], tool_key: Optional[str] = None) -> str:
         """
         Add a new tool result to the knowledge graph
         
         Args:
             knowledge_entry: Tool execution entry from knowledge sequence
+            tool_key: Key already computed for this entry (e.g. for preflight);
+                computed here when omitted
             
         Returns:
             str: Tool ID (e.g., "TR-1")
         """
-        self.tool_counter += 1
-        tool_id = f"TR-{self.tool_counter}"
+        tool_result, result_text, cache = self._prepare_tool_result(
+            knowledge_entry, self._reserve_tool_counters(1), tool_key
+        )
 
-        action_type = knowledge_entry.get("action_type", "unknown")
-        action_norm = self._normalize_action(knowledge_entry.get("action", {}) or {})
-        tool_key = self._make_tool_key(action_type, action_norm)
-        resource_ids = self._extract_resource_ids(action_type, action_norm)
-        op_type = self._classify_op(action_type, action_norm)
+        # The tool node and any resource last-write markers go in one transaction
+        self._store_tool_result(tool_result, result_text, cache)
+        self._track_stored(tool_result, cache)
+
+        # Write-aware housekeeping: purge reads the write invalidated
+        if cache["op_type"] == "write":
+            self._purge_after_write(cache["resource_ids"], tool_result.timestamp)
+
+        logger.info("Added tool result %s with %s tokens", tool_result.tool_id, tool_result.token_count)
+        return tool_result.tool_id
+
+    def add_tool_results_bulk(self, knowledge_entries: List[Dict[str, Any]],
+                              fields: Optional[List[CacheFields]] = None) -> List[str]:
+        """
+        Add many tool results to the knowledge graph in a single Neo4j transaction
+        
+        Resource last-write markers are written in the same transaction (the latest
+        write per resource wins); stale-read purges run afterwards in trace order,
+        so the final graph matches what sequential add_tool_result calls would
+        have produced, provided entry timestamps are non-decreasing in list order
+        (a purge here also sees reads that come after the write in the batch, and
+        only spares them because they are not older than it).
+        
+        Args:
+            knowledge_entries: Tool execution entries from knowledge sequence
+            fields: Cache fields already derived for each entry (as returned by
+                plan_reuse), so keys aren't hashed again; derived here when omitted
+            
+        Returns:
+            List[str]: Tool IDs in the same order as the entries
+        """
+        if not knowledge_entries:
+            return []
+        first_counter = self._reserve_tool_counters(len(knowledge_entries))
+        prepared = [
+            self._prepare_tool_result(entry, first_counter + i, count_tokens=False,
+                                      fields=fields[i] if fields is not None else None)
+            for i, entry in enumerate(knowledge_entries)
+        ]
+        # Token counts for the whole batch come from one batched tokenizer call
+        token_counts = self._count_tokens_batch_cached([result_text for _, result_text, _ in prepared])
+        for (tool_result, _, _), token_count in zip(prepared, token_counts):
+            tool_result.token_count = token_count
+
+        nodes = [self._tool_result_node(tool_result, result_text, cache) for tool_result, result_text, cache in prepared]
+        last_writes: Dict[str, str] = {}
+        for tool_result, _, cache in prepared:
+            if cache["op_type"] == "write":
+                write_ts = _canonical_ts(tool_result.timestamp)
+                for rid in cache["resource_ids"]:
+                    last_writes[rid] = write_ts
+        nodes.extend(self._changed_marker_nodes(last_writes))
+        self.neo4j_service.update_nodes_bulk(nodes, workflow_id=self.workflow_id)
+        self._written_marker_ts.update(last_writes)
+        for tool_result, _, cache in prepared:
+            self._track_stored(tool_result, cache)
+
+        for tool_result, _, cache in prepared:
+            if cache["op_type"] == "write":
+                self._purge_after_write(cache["resource_ids"], tool_result.timestamp)
+
+        total_tokens = sum(tool_result.token_count for tool_result, _, _ in prepared)
+        logger.info("Added %s tool results with %s tokens", len(prepared), total_tokens)
+        return [tool_result.tool_id for tool_result, _, _ in prepared]
+
+    def _reserve_tool_counters(self, count: int) -> int:
+        """
+        Atomically reserve count consecutive tool counters in the graph
+        
+        Returns:
+            int: The first reserved counter
+        """
+        self.tool_counter = self.neo4j_service.increment_tool_counter(
+            self.workflow_id, count, initial=self.tool_counter
+        )
+        return self.tool_counter - count + 1
+
+    def _prepare_tool_result(self, knowledge_entry: Dict[str, Any], counter: int,
+                             tool_key: Optional[str] = None,
+                             count_tokens: bool = True,
+                             fields: Optional[CacheFields] = None) -> Tuple[ToolResult, str, Dict[str, Any]]:
+        """
+        Build the stored representation of an entry under tool ID TR-<counter>
+        
+        With count_tokens=False the token count is left at 0 for the caller to fill in;
+        fields reuses cache fields the caller already derived with _cache_fields
+        
+        Returns:
+            Tuple of (tool_result, serialized content, cache fields {tool_key, resource_ids, op_type})
+        """
+        tool_id = f"TR-{counter}"
+
+        if fields is None:
+            fields = self._cache_fields(knowledge_entry, tool_key)
+        action_type, action_norm, tool_key, resource_ids, op_type = fields
 
         to_store = dict(knowledge_entry)
         to_store.setdefault("action", action_norm)
-        to_store["cache"] = {
+        cache = {
             "tool_key": tool_key,
             "resource_ids": resource_ids,
             "op_type": op_type,
         }
+        to_store["cache"] = cache
 
-        result_text = json.dumps(to_store, indent=2)
-        token_count = self.token_counter.count_tokens(result_text)
+        result_text = json_codec.dumps(to_store)
+        token_count = self._count_tokens_cached(result_text) if count_tokens else 0
 
         tool_result = ToolResult(
             tool_id=tool_id,
             action_type=action_type,
             action=action_norm,
             result=knowledge_entry.get("result", {}),
-            timestamp=knowledge_entry.get("timestamp", datetime.now().isoformat()),
+            timestamp=knowledge_entry["timestamp"] if "timestamp" in knowledge_entry else _now_iso(),
             token_count=token_count,
             status=knowledge_entry.get("result", {}).get("status", "unknown"),
         )
 
-        self._store_tool_result(tool_result, result_text)
+        return tool_result, result_text, cache
+
+    def _cache_fields(self, knowledge_entry: Dict[str, Any],
+                      tool_key: Optional[str] = None) -> CacheFields:
+        """
+        Derive everything the reuse cache needs from an entry in one pass
+        
+        Returns:
+            Tuple of (action_type, normalized action, tool_key, resource_ids, op_type)
+        """
+        action_type = knowledge_entry.get("action_type", "unknown")
+        action_norm = self._normalize_action(knowledge_entry.get("action", {}) or {})
+        if tool_key is None:
+            tool_key = self._make_tool_key(action_type, action_norm)
+        resource_ids = self._extract_resource_ids(action_type, action_norm)
+        op_type = self._classify_op(action_type, action_norm)
+        return action_type, action_norm, tool_key, resource_ids, op_type
+
+    def _count_tokens_cached(self, text: str) -> int:
+        """Count tokens in text, reusing the count for text seen before"""
+        count = self._lookup_token_count(text)
+        if count is None:
+            count = self.token_counter.count_tokens(text)
+            self._remember_token_count(text, count)
+        return count
+
+    def _count_tokens_batch_cached(self, texts: List[str]) -> List[int]:
+        """Count tokens for many texts, batching the ones not seen before into one call"""
+        counts: Dict[str, int] = {}
+        missing: List[str] = []
+        with self._token_cache_lock:
+            cache = self._token_cache
+            for text in texts:
+                if text in counts:
+                    continue
+                count = cache.get(text)
+                if count is None:
+                    counts[text] = -1
+                    missing.append(text)
+                else:
+                    cache.move_to_end(text)
+                    counts[text] = count
+        if missing:
+            for text, count in zip(missing, self.token_counter.count_tokens_batch(missing)):
+                counts[text] = count
+                self._remember_token_count(text, count)
+        return [counts[text] for text in texts]
+
+    def _lookup_token_count(self, text: str) -> Optional[int]:
+        """Return the cached token count for text (marking it recently used), or None"""
+        with self._token_cache_lock:
+            cache = self._token_cache
+            count = cache.get(text)
+            if count is not None:
+                cache.move_to_end(text)
+            return count
+
+    def _remember_token_count(self, text: str, count: int) -> None:
+        """Store a token count in the LRU cache, evicting the oldest entry when full"""
+        with self._token_cache_lock:
+            cache = self._token_cache
+            cache[text] = count
+            cache.move_to_end(text)
+            if len(cache) > TOKEN_CACHE_SIZE:
+                cache.popitem(last=False)
+
+    def _track_stored(self, tool_result: ToolResult, cache: Dict[str, Any]) -> None:
+        """Keep the in-process reuse cache in step with a newly stored tool result"""
+        # A newer result supersedes the remembered hit for the same key
+        self._preflight_cache.pop(cache["tool_key"], None)
+        if cache["op_type"] != "write":
+            return
+        self._write_epoch += 1
+        write_ts = _canonical_ts(tool_result.timestamp)
+        if not write_ts:
+            # Unparsable write time: no remembered hit can be trusted
+            self._preflight_cache.clear()
+            return
+        for rid in cache["resource_ids"]:
+            if write_ts > self._resource_write_ts.get(rid, ""):
+                self._resource_write_ts[rid] = write_ts
 
-        # Write-aware housekeeping: update resource last write and purge stale reads
-        if op_type == "write":
-            for rid in resource_ids:
-                self._upsert_resource_last_write(rid, tool_result.timestamp)
-                purged = self._delete_stale_reads_for_resource(rid, tool_result.timestamp)
-                if purged:
-                    print(colored(f"Purged {purged} stale cached reads for {rid}", "yellow"))
+    def _purge_after_write(self, resource_ids: List[str], timestamp: str) -> None:
+        """Purge cached reads invalidated by a write to resource_ids at timestamp"""
+        if resource_ids:
+            purged = self._delete_stale_reads_for_resources(set(resource_ids), timestamp)
+            if purged:
+                logger.info("Purged %s stale cached reads for %s", purged, ", ".join(resource_ids))
 
-        print(colored(f"Added tool result {tool_id} with {token_count} tokens", "green"))
-        return tool_id
+    def _store_tool_result(self, tool_result: ToolResult, content: str, cache: Dict[str, Any]):
+        """Store tool result in Neo4j, with resource last-write markers for writes"""
+        nodes = [self._tool_result_node(tool_result, content, cache)]
+        last_writes: Dict[str, str] = {}
+        if cache["op_type"] == "write":
+            write_ts = _canonical_ts(tool_result.timestamp)
+            last_writes = {rid: write_ts for rid in cache["resource_ids"]}
+            nodes.extend(self._changed_marker_nodes(last_writes))
+        
+        self.neo4j_service.update_nodes_bulk(nodes, workflow_id=self.workflow_id)
+        self._written_marker_ts.update(last_writes)
 
-    def _store_tool_result(self, tool_result: ToolResult, content: str):
-        """Store tool result in Neo4j"""
+    def _tool_result_node(self, tool_result: ToolResult, content: str, cache: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Neo4j node row for a tool result"""
         # Create tool result node
-        metadata = f"tool_result_{tool_result.tool_id}"
+        metadata = _tr_key(tool_result.tool_id)
         summary = f"{tool_result.action_type}: {self._extract_brief_params(tool_result.action)} - {tool_result.status.upper()}"
         
-        self.neo4j_service.update_node(
-            metadata=metadata,
-            summary=summary,
-            content=content,
-            workflow_id=self.workflow_id
-        )
+        # Scalar fields the dashboard and the reuse cache need are also stored as
+        # top-level node properties so they can be read and filtered on by Neo4j
+        # without fetching and parsing content
+        properties = {
+            "action_type": tool_result.action_type,
+            "status": tool_result.status,
+            "token_count": tool_result.token_count,
+            "timestamp": _canonical_ts(tool_result.timestamp),
+            "tool_key": cache["tool_key"],
+            "op_type": cache["op_type"],
+            "resource_ids": cache["resource_ids"],
+            "counter": int(tool_result.tool_id.rpartition("-")[2]),
+        }
+        
+        return {"id": metadata, "summary": summary, "content": content, "properties": properties}
         
     def _extract_brief_params(self, action: Dict[str, Any]) -> str:
         """Extract brief parameter description from action"""
@@ -127,8 +513,10 @@ class KnowledgeGraphService:
             elif "query" in action:
                 return action["query"]
             elif "code" in action:
-                return f"code modification ({len(str(action['code']))} chars)"
-        return str(action)[:50] + "..." if len(str(action)) > 50 else str(action)
+                code = action["code"]
+                return f"code modification ({len(code) if isinstance(code, str) else len(str(code))} chars)"
+        text = str(action)
+        return text[:50] + "..." if len(text) > 50 else text
         
     def generate_summary(self, tool_id: str) -> Optional[ToolSummary]:
         """
@@ -141,49 +529,87 @@ class KnowledgeGraphService:
             ToolSummary or None if failed
         """
         try:
-            # Get tool result from Neo4j
-            tool_node = self.neo4j_service.get_node_by_metadata(
-                self.workflow_id, 
-                f"tool_result_{tool_id}"
-            )
-            
-            if not tool_node:
-                print(colored(f"Tool result {tool_id} not found", "red"))
+            tool_content = self._load_tool_content(tool_id)
+            if tool_content is None:
                 return None
-                
-            # Parse tool content
-            tool_content = json.loads(tool_node["content"])
             
             # Generate summary using LLM
             summary_content, salient_data = self._generate_tool_summary(tool_content)
             
-            # Calculate token count
-            token_count_str = summary_content
-            if salient_data:
-                if isinstance(salient_data, (dict, list)):
-                    token_count_str += json.dumps(salient_data)
-                else:
-                    token_count_str += str(salient_data)
-            
-            # Create summary object
-            summary = ToolSummary(
-                tool_id=tool_id,
-                summary_content=summary_content,
-                salient_data=salient_data,
-                token_count=self.token_counter.count_tokens(token_count_str),
-                timestamp=datetime.now().isoformat()
-            )
+            return self._build_and_store_summary(tool_id, summary_content, salient_data)
             
-            # Store summary in Neo4j
-            self._store_tool_summary(summary)
+        except Exception as e:
+            logger.error("Error generating summary for %s: %s", tool_id, e)
+            return None
+    
+    async def agenerate_summary(self, tool_id: str) -> Optional[ToolSummary]:
+        """
+        Async variant of generate_summary
+        
+        The LLM call is awaited on the event loop so many summaries can be in
+        flight at once; the blocking Neo4j reads/writes run in worker threads.
+        
+        Args:
+            tool_id: Tool ID to summarize
             
-            print(colored(f"Generated summary for {tool_id}", "green"))
-            return summary
+        Returns:
+            ToolSummary or None if failed
+        """
+        try:
+            tool_content = await asyncio.to_thread(self._load_tool_content, tool_id)
+            if tool_content is None:
+                return None
+            
+            summary_content, salient_data = await self._agenerate_tool_summary(tool_content)
+            
+            return await asyncio.to_thread(
+                self._build_and_store_summary, tool_id, summary_content, salient_data
+            )
             
         except Exception as e:
-            print(colored(f"Error generating summary for {tool_id}: {str(e)}", "red"))
+            logger.error("Error generating summary for %s: %s", tool_id, e)
+            return None
+    
+    def _load_tool_content(self, tool_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch and parse the stored content of a tool result"""
+        tool_node = self.neo4j_service.get_node_by_metadata(
+            self.workflow_id, 
+            _tr_key(tool_id)
+        )
+        
+        if not tool_node:
+            logger.error("Tool result %s not found", tool_id)
             return None
             
+        return json_codec.loads(tool_node["content"])
+    
+    def _build_and_store_summary(self, tool_id: str, summary_content: str,
+                                 salient_data: Optional[Any]) -> ToolSummary:
+        """Create a ToolSummary from LLM output and persist it"""
+        # Calculate token count; the parts are counted separately (BPE counts are
+        # additive to within a token at the join) so no concatenated copy is built
+        token_count = self._count_tokens_cached(summary_content)
+        if salient_data:
+            if isinstance(salient_data, (dict, list)):
+                token_count += self._count_tokens_cached(json_codec.dumps(salient_data))
+            else:
+                token_count += self._count_tokens_cached(str(salient_data))
+        
+        # Create summary object
+        summary = ToolSummary(
+            tool_id=tool_id,
+            summary_content=summary_content,
+            salient_data=salient_data,
+            token_count=token_count,
+            timestamp=_now_iso()
+        )
+        
+        # Store summary in Neo4j
+        self._store_tool_summary(summary)
+        
+        logger.info("Generated summary for %s", tool_id)
+        return summary
+            
     def _generate_tool_summary(self, tool_content: Dict[str, Any]) -> Tuple[str, Optional[Any]]:
         """Generate summary and salient data for a tool result"""
         try:
@@ -195,13 +621,27 @@ class KnowledgeGraphService:
             return summary, salient_data
             
         except Exception as e:
-            print(colored(f"Error in LLM summary generation: {str(e)}", "red"))
+            logger.error("Error in LLM summary generation: %s", e)
+            return f"Summary generation failed: {str(e)}", None
+    
+    async def _agenerate_tool_summary(self, tool_content: Dict[str, Any]) -> Tuple[str, Optional[Any]]:
+        """Async variant of _generate_tool_summary"""
+        try:
+            result = await self.llm_service.agenerate_summary(tool_content, TOOL_SUMMARY_PROMPT)
+            
+            summary = result.get("summary", "")
+            salient_data = result.get("salient_data")
+            
+            return summary, salient_data
+            
+        except Exception as e:
+            logger.error("Error in LLM summary generation: %s", e)
             return f"Summary generation failed: {str(e)}", None
             
     def _store_tool_summary(self, summary: ToolSummary):
         """Store tool summary in Neo4j"""
         # Create summary node
-        summary_metadata = f"summary_{summary.tool_id}"
+        summary_metadata = _sum_key(summary.tool_id)
         
         # Prepare content
         summary_content = {
@@ -212,7 +652,7 @@ class KnowledgeGraphService:
         }
         
         # Serialize the entire content to JSON for storage
-        content_json = json.dumps(summary_content)
+        content_json = json_codec.dumps(summary_content)
         
         self.neo4j_service.update_node(
             metadata=summary_metadata,
@@ -223,39 +663,79 @@ class KnowledgeGraphService:
         
         # Create relationship between tool and summary
         self.neo4j_service.update_edge(
-            source_metadata=f"tool_result_{summary.tool_id}",
+            source_metadata=_tr_key(summary.tool_id),
             target_metadata=summary_metadata,
             relation_type=RelationshipType.SUMMARIZES,
             description=f"Summary of tool result {summary.tool_id}",
             workflow_id=self.workflow_id
         )
         
+    @staticmethod
+    def _load_summary_content(summary_node: Dict[str, Any]) -> Dict[str, Any]:
+        """Decode the content stored on a summary node (see _store_tool_summary)"""
+        return json_codec.loads(summary_node["content"])
+
     def get_all_tool_results(self) -> List[ToolResult]:
         """Get all tool results for display"""
-        tool_results = []
+        return list(self.iter_tool_results())
+
+    def iter_tool_results(self) -> Iterator[ToolResult]:
+        """
+        Stream tool results in tool ID order, building each ToolResult as its
+        node arrives from Neo4j so only one parsed node is held at a time
+        """
+        for node in self.neo4j_service.iter_nodes_by_prefix(self.workflow_id, TOOL_RESULT_ID_PREFIX):
+            yield self._tool_result_from_node(node)
+
+    def _tool_result_from_node(self, node: Dict[str, Any]) -> ToolResult:
+        """Build a ToolResult from a stored tool result node"""
+        raw = node["content"]
+        content = json_codec.loads(raw)
         
-        # Get all tool result nodes
-        nodes = self.neo4j_service.get_all_nodes(self.workflow_id)
+        # Token count is stored as a node property; only legacy nodes need re-tokenizing
+        token_count = node.get("token_count")
+        if token_count is None:
+            token_count = self._count_tokens_cached(raw)
         
-        for node in nodes:
-            if node["id"].startswith("tool_result_"):
-                tool_id = node["id"].replace("tool_result_", "")
-                content = json.loads(node["content"])
-                
-                tool_result = ToolResult(
-                    tool_id=tool_id,
-                    action_type=content.get("action_type", "unknown"),
-                    action=content.get("action", {}),
-                    result=content.get("result", {}),
-                    timestamp=content.get("timestamp", ""),
-                    token_count=self.token_counter.count_tokens(json.dumps(content)),
-                    status=content.get("result", {}).get("status", "unknown")
-                )
-                
-                tool_results.append(tool_result)
-                
-        # Sort by tool ID number
-        tool_results.sort(key=lambda x: int(x.tool_id.split("-")[1]))
+        return ToolResult(
+            tool_id=_tool_id_from_key(node["id"]),
+            action_type=content.get("action_type", "unknown"),
+            action=content.get("action", {}),
+            result=content.get("result", {}),
+            timestamp=content.get("timestamp", ""),
+            token_count=token_count,
+            status=content.get("result", {}).get("status", "unknown")
+        )
+
+    def _get_dashboard_tool_results(self, collapsed_tool_ids: Set[str]) -> List[ToolResult]:
+        """
+        Fetch tool results for a dashboard render in one query, projecting only
+        scalar node properties for rows that will be shown compressed
+        
+        Rows shown in full (and legacy nodes stored without the scalar
+        properties) come back with their content.
+        """
+        rows = self.neo4j_service.get_tool_result_rows(
+            self.workflow_id, TOOL_RESULT_ID_PREFIX, ["action_type", "status", "token_count"],
+            skip_content_ids=[_tr_key(tool_id) for tool_id in collapsed_tool_ids]
+        )
+        
+        tool_results = []
+        for row in rows:
+            if row["content"] is not None:
+                tool_results.append(self._tool_result_from_node(row))
+            else:
+                # Compressed row: only the ID and token count are rendered
+                tool_results.append(ToolResult(
+                    tool_id=_tool_id_from_key(row["id"]),
+                    action_type=row["action_type"] or "unknown",
+                    action={},
+                    result={},
+                    timestamp="",
+                    token_count=row["token_count"],
+                    status=row["status"] or "unknown",
+                    is_compressed=True
+                ))
         return tool_results
         
     def compress_tool_results(self, tool_ids: List[str]) -> bool:
@@ -265,68 +745,126 @@ class KnowledgeGraphService:
         Args:
             tool_ids: List of tool IDs to compress
             
+        Returns:
+            bool: Success status
+        """
+        # The compression node and all its edges are written in one transaction
+        return self.compress_tool_results_multi([tool_ids])
+
+    def compress_tool_results_multi(self, tool_id_groups: List[List[str]]) -> bool:
+        """
+        Compress several groups of tool results, writing every compression node
+        and edge in a single Neo4j transaction
+        
+        Args:
+            tool_id_groups: List of tool ID groups, one compression per group
+            
         Returns:
             bool: Success status
         """
         try:
-            # Get individual summaries for all tools
-            summaries = []
-            
-            for tool_id in tool_ids:
-                # Try to get existing summary
-                summary_node = self.neo4j_service.get_node_by_metadata(
-                    self.workflow_id,
-                    f"summary_{tool_id}"
+            # Summaries for every group are fetched together
+            summary_texts = self._collect_summary_texts([tool_id for tool_ids in tool_id_groups for tool_id in tool_ids])
+            
+            nodes = []
+            edges = []
+            for tool_ids in tool_id_groups:
+                compression_id, compression_content = self._build_compression(tool_ids, summary_texts)
+                nodes.append({
+                    "id": compression_id,
+                    "summary": f"Compression of tools {', '.join(tool_ids)}",
+                    "content": json_codec.dumps(compression_content),
+                })
+                edges.extend(
+                    {
+                        "source": compression_id,
+                        "target": _tr_key(tool_id),
+                        "relation_type": RelationshipType.COMPRESSES,
+                        "description": f"Compresses tool {tool_id}",
+                    }
+                    for tool_id in tool_ids
                 )
-                
-                if summary_node:
-                    summary_content = json.loads(summary_node["content"])
-                    summaries.append(f"[{tool_id}] {summary_content['summary']}")
-                else:
-                    # Generate summary if it doesn't exist
-                    self.generate_summary(tool_id)
-                    summary_node = self.neo4j_service.get_node_by_metadata(
-                        self.workflow_id,
-                        f"summary_{tool_id}"
-                    )
-                    if summary_node:
-                        summary_content = json.loads(summary_node["content"])
-                        summaries.append(f"[{tool_id}] {summary_content['summary']}")
-                    else:
-                        summaries.append(f"[{tool_id}] Summary not available")
-            
-            # Create compression node with individual summaries
-            compression_id = f"compression_{'-'.join(tool_ids)}"
-            compression_content = {
-                "compressed_tools": tool_ids,
-                "summary": " | ".join(summaries),
-                "timestamp": datetime.now().isoformat()
-            }
             
-            self.neo4j_service.update_node(
-                metadata=compression_id,
-                summary=f"Compression of tools {', '.join(tool_ids)}",
-                content=json.dumps(compression_content),
-                workflow_id=self.workflow_id
-            )
+            self.neo4j_service.update_graph_bulk(nodes, edges, workflow_id=self.workflow_id)
             
-            # Create relationships to compressed tools
-            for tool_id in tool_ids:
-                self.neo4j_service.update_edge(
-                    source_metadata=compression_id,
-                    target_metadata=f"tool_result_{tool_id}",
-                    relation_type=RelationshipType.COMPRESSES,
-                    description=f"Compresses tool {tool_id}",
-                    workflow_id=self.workflow_id
-                )
-                
-            print(colored(f"Compressed tools {', '.join(tool_ids)}", "green"))
+            for tool_ids in tool_id_groups:
+                logger.info("Compressed tools %s", ', '.join(tool_ids))
             return True
             
         except Exception as e:
-            print(colored(f"Error compressing tools: {str(e)}", "red"))
+            logger.error("Error compressing tools: %s", e)
             return False
+
+    def _build_compression(self, tool_ids: List[str], summary_texts: Dict[str, str]) -> Tuple[str, Dict[str, Any]]:
+        """Collect individual summary texts into compression content"""
+        summaries = []
         
+        for tool_id in tool_ids:
+            summary_text = summary_texts.get(tool_id)
+            if summary_text is not None:
+                summaries.append(f"[{tool_id}] {summary_text}")
+            else:
+                summaries.append(f"[{tool_id}] Summary not available")
+        
+        # Create compression node with individual summaries
+        compression_id = f"compression_{'-'.join(tool_ids)}"
+        compression_content = {
+            "compressed_tools": tool_ids,
+            "summary": " | ".join(summaries),
+            "timestamp": _now_iso()
+        }
+        return compression_id, compression_content
+
+    def _collect_summary_texts(self, tool_ids: List[str]) -> Dict[str, str]:
+        """
+        Get the summary text of many tools, fetching existing summaries in one
+        query and generating missing ones; returns tool ID -> summary text
+        """
+        unique_tool_ids = list(dict.fromkeys(tool_ids))
+        summary_nodes = self.neo4j_service.get_nodes_by_metadatas(
+            self.workflow_id, [_sum_key(tool_id) for tool_id in unique_tool_ids]
+        )
+        
+        summary_texts = {}
+        missing_tool_ids = []
+        for tool_id in unique_tool_ids:
+            summary_node = summary_nodes.get(_sum_key(tool_id))
+            if summary_node:
+                summary_texts[tool_id] = self._load_summary_content(summary_node)["summary"]
+            else:
+                missing_tool_ids.append(tool_id)
+        
+        if missing_tool_ids:
+            # Generate summaries that don't exist yet (LLM calls overlap in worker
+            # threads) and use the returned summaries instead of reading them back
+            with ThreadPoolExecutor(max_workers=min(SUMMARY_WORKERS, len(missing_tool_ids))) as executor:
+                for tool_id, summary in zip(missing_tool_ids, executor.map(self.generate_summary, missing_tool_ids)):
+                    if summary:
+                        summary_texts[tool_id] = summary.summary_content
+        
+        return summary_texts
+        
+    def _get_node(self, metadata: str) -> Optional[Dict]:
+        """Get a node by metadata ID, memoized while a dashboard render is in progress"""
+        cache = self._node_cache
+        if cache is None:
+            return self.neo4j_service.get_node_by_metadata(self.workflow_id, metadata)
+        if metadata not in cache:
+            cache[metadata] = self.neo4j_service.get_node_by_metadata(self.workflow_id, metadata)
+        return cache[metadata]
+
+    def _prefetch_nodes(self, metadatas: List[str]) -> None:
+        """Load nodes into the per-render cache with one query (missing nodes are cached as None)"""
+        cache = self._node_cache
+        if cache is None:
+            return
+        wanted = [metadata for metadata in metadatas if metadata not in cache]
+        if not wanted:
+            return
+        found = self.neo4j_service.get_nodes_by_metadatas(self.workflow_id, wanted)
+        for metadata in wanted:
+            cache[metadata] = found.get(metadata)
+
     def retrieve_tool_result_with_salient_data(self, tool_id: str) -> Optional[str]:
         """
         Retrieve summary with salient data for a tool
@@ -339,39 +877,72 @@ class KnowledgeGraphService:
         """
         try:
             # Get summary node
-            summary_node = self.neo4j_service.get_node_by_metadata(
-                self.workflow_id,
-                f"summary_{tool_id}"
-            )
+            summary_node = self._get_node(_sum_key(tool_id))
             
             if not summary_node:
                 return None
                 
-            summary_content = json.loads(summary_node["content"])
-            summary_text = summary_content.get("summary", "")
-            salient_data = summary_content.get("salient_data")
-            
-            # Format the result with salient data
-            if salient_data:
-                if isinstance(salient_data, dict) and salient_data:
-                    salient_parts = []
-                    for key, value in salient_data.items():
-                        if isinstance(value, str) and len(value) > 50:
-                            value = value[:50] + "..."
-                        salient_parts.append(f"{key}: {value}")
-                    return f"{summary_text} ({', '.join(salient_parts)})"
-                    
-                elif isinstance(salient_data, str) and salient_data.strip():
-                    return f"{summary_text} ({salient_data})"
-                        
-                elif isinstance(salient_data, list) and salient_data:
-                    return f"{summary_text} ({', '.join(str(item) for item in salient_data)})"
-            
-            return summary_text
+            summary_content = self._load_summary_content(summary_node)
+            return self._format_summary_with_salient_data(summary_content)
                 
         except Exception as e:
-            print(colored(f"Error retrieving summary with salient data for {tool_id}: {str(e)}", "red"))
+            logger.error("Error retrieving summary with salient data for %s: %s", tool_id, e)
             return None
+
+    def retrieve_tool_results_with_salient_data(self, tool_ids: List[str]) -> Dict[str, Optional[str]]:
+        """
+        Batched variant of retrieve_tool_result_with_salient_data
+        
+        Args:
+            tool_ids: Tool IDs to retrieve
+            
+        Returns:
+            Dict mapping tool ID -> formatted summary (None if unavailable), in tool_ids order
+        """
+        try:
+            summary_nodes = self.neo4j_service.get_nodes_by_metadatas(
+                self.workflow_id,
+                [_sum_key(tool_id) for tool_id in tool_ids]
+            )
+        except Exception as e:
+            logger.error("Error retrieving summaries with salient data: %s", e)
+            return {tool_id: None for tool_id in tool_ids}
+        
+        results = {}
+        for tool_id in tool_ids:
+            summary_node = summary_nodes.get(_sum_key(tool_id))
+            if not summary_node:
+                results[tool_id] = None
+                continue
+            try:
+                results[tool_id] = self._format_summary_with_salient_data(self._load_summary_content(summary_node))
+            except Exception as e:
+                logger.error("Error retrieving summary with salient data for %s: %s", tool_id, e)
+                results[tool_id] = None
+        return results
+
+    def _format_summary_with_salient_data(self, summary_content: Dict[str, Any]) -> str:
+        """Format a stored summary with its salient data as a one-liner"""
+        summary_text = summary_content.get("summary", "")
+        salient_data = summary_content.get("salient_data")
+        
+        # Format the result with salient data
+        if salient_data:
+            if isinstance(salient_data, dict) and salient_data:
+                salient_parts = []
+                for key, value in salient_data.items():
+                    if isinstance(value, str) and len(value) > 50:
+                        value = value[:50] + "..."
+                    salient_parts.append(f"{key}: {value}")
+                return f"{summary_text} ({', '.join(salient_parts)})"
+                
+            elif isinstance(salient_data, str) and salient_data.strip():
+                return f"{summary_text} ({salient_data})"
+                    
+            elif isinstance(salient_data, list) and salient_data:
+                return f"{summary_text} ({', '.join(str(item) for item in salient_data)})"
+        
+        return summary_text
             
     def retrieve_tool_result(self, tool_id: str, summary: bool = False) -> Optional[str]:
         """
@@ -387,32 +958,26 @@ class KnowledgeGraphService:
         try:
             if summary:
                 # Get summary
-                summary_node = self.neo4j_service.get_node_by_metadata(
-                    self.workflow_id,
-                    f"summary_{tool_id}"
-                )
+                summary_node = self._get_node(_sum_key(tool_id))
                 
                 if summary_node:
-                    summary_content = json.loads(summary_node["content"])
+                    summary_content = self._load_summary_content(summary_node)
                     return summary_content["summary"]
                 else:
                     return f"Summary not available for {tool_id}"
                     
             else:
                 # Get full result
-                tool_node = self.neo4j_service.get_node_by_metadata(
-                    self.workflow_id,
-                    f"tool_result_{tool_id}"
-                )
+                tool_node = self._get_node(_tr_key(tool_id))
                 
                 if tool_node:
-                    tool_content = json.loads(tool_node["content"])
+                    tool_content = json_codec.loads(tool_node["content"])
                     return self._format_full_tool_result(tool_id, tool_content)
                 else:
                     return f"Tool result not found for {tool_id}"
                     
         except Exception as e:
-            print(colored(f"Error retrieving tool result {tool_id}: {str(e)}", "red"))
+            logger.error("Error retrieving tool result %s: %s", tool_id, e)
             return f"Error retrieving {tool_id}: {str(e)}"
             
     def _format_full_tool_result(self, tool_id: str, content: Dict[str, Any]) -> str:
@@ -422,7 +987,7 @@ class KnowledgeGraphService:
         
         lines = [
             f"[{tool_id}] {content.get('action_type', 'unknown')}:",
-            f"Input: {json.dumps(action, indent=2)}",
+            f"Input: {json_codec.dumps(action, indent=True)}",
             f"Result: {result.get('status', 'unknown')}",
             f"Output: {result.get('output', 'None')}",
             f"Error: {result.get('error', 'None')}"
@@ -434,70 +999,89 @@ class KnowledgeGraphService:
         """Reset all data for this workflow"""
         self.neo4j_service.reset_graph_by_workflow(self.workflow_id)
         self.tool_counter = 0
-        print(colored(f"Reset workflow {self.workflow_id}", "yellow"))
+        self._preflight_cache.clear()
+        self._resource_write_ts.clear()
+        self._written_marker_ts.clear()
+        logger.info("Reset workflow %s", self.workflow_id)
         
     def generate_dashboard(self, compressed_tool_groups: Dict[str, Dict[str, Any]] = None,
-                          expanded_tools: Set[str] = None) -> str:
+                          expanded_tools: Set[str] = None,
+                          tool_results: Optional[List[ToolResult]] = None,
+                          compressed_tool_ids: Optional[FrozenSet[str]] = None) -> str:
         """
         Generate tool dashboard with compression/expansion state
         
         Args:
             compressed_tool_groups: Dict mapping group_id -> {tool_ids, summary, timestamp}
             expanded_tools: Set of tool IDs that should show expanded details
+            tool_results: Tool results already fetched via get_all_tool_results;
+                fetched from Neo4j when omitted
+            compressed_tool_ids: All tool IDs in compressed_tool_groups, for callers
+                rendering the same groups repeatedly (see compressed_ids);
+                derived from the groups when omitted
             
         Returns:
             str: Formatted tool dashboard
         """
-        if compressed_tool_groups is None:
-            compressed_tool_groups = {}
-        if expanded_tools is None:
-            expanded_tools = set()
+        # Repeated node lookups within this render hit the per-render cache
+        self._node_cache = {}
+        try:
+            return self._render_dashboard(compressed_tool_groups, expanded_tools, tool_results, compressed_tool_ids)
+        finally:
+            self._node_cache = None
+
+    @staticmethod
+    def compressed_ids(compressed_tool_groups: Dict[str, Dict[str, Any]]) -> FrozenSet[str]:
+        """All tool IDs covered by the given compression groups"""
+        return frozenset(chain.from_iterable(
+            group_info.get("tool_ids", ()) for group_info in compressed_tool_groups.values()
+        ))
+
+    def _render_dashboard(self, compressed_tool_groups: Optional[Dict[str, Dict[str, Any]]],
+                          expanded_tools: Optional[Set[str]],
+                          tool_results: Optional[List[ToolResult]],
+                          compressed_tool_ids: Optional[FrozenSet[str]]) -> str:
+        """Build the dashboard text (see generate_dashboard)"""
+        # Build a set of all compressed tool IDs for quick lookup
+        if compressed_tool_ids is None:
+            compressed_tool_ids = self.compressed_ids(compressed_tool_groups or {})
         
-        # Get all tool results
-        tool_results = self.get_all_tool_results()
+        # Rows rendered as compressed one-liners: decided once, not per row
+        collapsed_tool_ids = compressed_tool_ids.difference(expanded_tools or ())
+        
+        # Get all tool results (compressed rows without their content)
+        if tool_results is None:
+            tool_results = self._get_dashboard_tool_results(collapsed_tool_ids)
         
         if not tool_results:
             return "=== ACTIVE TOOL RESULTS ===\nNo tool results yet."
         
-        # Build a set of all compressed tool IDs for quick lookup
-        compressed_tool_ids = set()
-        for group_info in compressed_tool_groups.values():
-            compressed_tool_ids.update(group_info.get("tool_ids", []))
+        # Summaries of every compressed row are fetched in one query up front
+        self._prefetch_nodes([_sum_key(tool_id) for tool_id in collapsed_tool_ids])
         
         # Generate dashboard
         lines = ["=== ACTIVE TOOL RESULTS ==="]
+        lines_append = lines.append
+        format_row = _format_expanded_row
         total_tokens = 0
         
         for tool in tool_results:
             tool_id = tool.tool_id
             
             # Check if this tool is compressed
-            if tool_id in compressed_tool_ids and tool_id not in expanded_tools:
+            if tool_id in collapsed_tool_ids:
                 # Show compressed version
                 summary_with_data = self.retrieve_tool_result_with_salient_data(tool_id)
                 if summary_with_data:
-                    lines.append(f"[{tool_id}] {summary_with_data} [COMPRESSED]")
+                    lines_append(f"[{tool_id}] {summary_with_data} [COMPRESSED]")
                 else:
                     summary = self.retrieve_tool_result(tool_id, summary=True)
-                    lines.append(f"[{tool_id}] {summary} [COMPRESSED]")
+                    lines_append(f"[{tool_id}] {summary} [COMPRESSED]")
             else:
                 # Show full expanded view
-                status = tool.status.upper()
-                warning = " ⚠️" if tool.status == "error" or tool.token_count > 5000 else ""
-                
-                lines.append(f"[{tool_id}] {tool.action_type} - {status} ({tool.token_count:,} tokens){warning}")
-                lines.append(f"Input: {json.dumps(tool.action)}")
-                lines.append(f"Result: {status.lower()}")
-                
-                output = tool.result.get("output", "")
-                if output:
-                    lines.append(f"Output: {output}")
-                
-                error = tool.result.get("error", "")
-                if error:
-                    lines.append(f"Error: {error}")
+                lines_append(format_row(tool))
             
-            lines.append("")  # Add spacing between tools
+            lines_append("")  # Add spacing between tools
             total_tokens += tool.token_count
         
         # Add token usage summary
@@ -513,8 +1097,13 @@ class KnowledgeGraphService:
         - sort keys
         - sort lists where order doesn't matter (files)
         - coerce None/empty cwd
+        Actions needing none of these are returned as-is, without a copy.
         """
-        a = dict(action or {})
+        a = action or {}
+        if not (isinstance(a.get("files"), list) or isinstance(a.get("args"), list)
+                or ("cwd" in a and a["cwd"] is None)):
+            return a
+        a = dict(a)
         if "files" in a and isinstance(a["files"], list):
             a["files"] = sorted([str(x) for x in a["files"]])
         if "args" in a and isinstance(a["args"], list):
@@ -524,15 +1113,26 @@ class KnowledgeGraphService:
         return a
 
 
+    def make_tool_key(self, action_type: str, action: Dict[str, Any]) -> str:
+        """Cache key of a tool call, for passing to both preflight and add_tool_result"""
+        return self._make_tool_key(action_type, action)
+
     def _make_tool_key(self, action_type: str, action: Dict[str, Any]) -> str:
         """
         Stable fingerprint of (intent + params) used to detect repeated calls.
         """
         norm = self._normalize_action(action)
-        norm_json = json.dumps(norm, sort_keys=True, separators=(",", ":"))
-        digest = hashlib.sha256((action_type + "|" + norm_json).encode()).hexdigest()[:16]
+        # Canonical encoding keeps keys identical to ones already in the graph
+        norm_json = json_codec.dumps_canonical(norm)
+        digest = hashlib.sha256(action_type.encode() + b"|" + norm_json).hexdigest()[:16]
         return f"{action_type}:{digest}"
 
+    def _action_resource_ids(self, action_type: str, action: Dict[str, Any]) -> List[str]:
+        """Resource ids of a raw action, skipping normalization for types that never have any"""
+        if action_type not in _RESOURCE_ACTIONS:
+            return []
+        return self._extract_resource_ids(action_type, self._normalize_action(action))
+
     def _extract_resource_ids(self, action_type: str, action: Dict[str, Any]) -> List[str]:
         """
         Extract one or more resource anchors (file path, ARN, bucket, query, group).
@@ -541,7 +1141,7 @@ class KnowledgeGraphService:
         a = action or {}
 
         # Codebase tools
-        if action_type in {"create_file", "delete_file", "read_file_contents", "run_file"}:
+        if action_type in _FILE_PATH_ACTIONS:
             fp = a.get("file_path")
             if fp: ids.append(str(fp))
         if action_type == "modify_code":
@@ -551,14 +1151,18 @@ class KnowledgeGraphService:
         # CLI (execute_command) heuristics
         if action_type == "execute_command":
             cmd = (a.get("command") or "")
-            if "s3://" in cmd:
-                after = cmd.split("s3://", 1)[-1]
-                bucket = after.split()[0]
-                if bucket: ids.append(f"s3://{bucket}")
-            if "--policy-arn" in cmd:
-                for tok in cmd.split():
-                    if tok.startswith("arn:"):
-                        ids.append(tok)
+            # One tokenization serves both the bucket and the ARN scans
+            bucket, arns, has_policy_arn = None, [], False
+            for tok in cmd.split():
+                if bucket is None and "s3://" in tok:
+                    bucket = tok.split("s3://", 1)[1]
+                if tok.startswith("arn:"):
+                    arns.append(tok)
+                elif "--policy-arn" in tok:
+                    has_policy_arn = True
+            if bucket: ids.append(f"s3://{bucket}")
+            if has_policy_arn:
+                ids.extend(arns)
             if "--group-name" in cmd:
                 tail = cmd.split("--group-name", 1)[-1].strip()
                 if tail.startswith("="): tail = tail[1:].strip()
@@ -579,195 +1183,330 @@ class KnowledgeGraphService:
             q = a.get("query")
             if q: ids.append(f"web:{q}")
 
-        # dedup
-        out, seen = [], set()
-        for rid in ids:
-            if rid and rid not in seen:
-                seen.add(rid); out.append(rid)
-        return out
+        # dedup, keeping first-seen order
+        return [rid for rid in dict.fromkeys(ids) if rid]
 
     def _classify_op(self, action_type: str, action: Dict[str, Any]) -> str:
         """
         'write' if likely to mutate, else 'read'.
+        Only the command string matters for classification, so results are
+        memoized on (action_type, command).
         """
-        if action_type in {"create_file", "modify_code", "delete_file"}:
+        command = action.get("command") if action_type == "execute_command" else None
+        return self._classify_op_cached(action_type, command or "")
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _classify_op_cached(action_type: str, command: str) -> str:
+        if action_type in _WRITE_ACTION_TYPES:
             return "write"
         if action_type == "execute_command":
-            cmd = (action.get("command") or "").lower()
-            write_markers = [
-                " create-", " put-", " attach-", " update-", " delete-",
-                " remove-", " set-", " cp ", " mv ", " rm ",
-            ]
-            if any(m in f" {cmd} " for m in write_markers):
+            if is_write_command(command):
                 return "write"
         return "read"
 
     def _resource_node_id(self, resource_id: str) -> str:
         return f"resource::{resource_id.replace(' ', '_')}"
 
-    def _upsert_resource_last_write(self, resource_id: str, ts_iso: str) -> None:
-        node_id = self._resource_node_id(resource_id)
-        content = {"last_write_ts": ts_iso}
-        self.neo4j_service.update_node(
-            metadata=node_id,
-            summary=f"Resource {resource_id}",
-            content=json.dumps(content),
-            workflow_id=self.workflow_id,
-        )
+    def _changed_marker_nodes(self, last_writes: Dict[str, str]) -> List[Dict[str, Any]]:
+        """
+        Marker node rows for resource -> canonical write timestamp pairs, skipping
+        markers this process already wrote with the same timestamp
+        """
+        written = self._written_marker_ts
+        return [
+            self._resource_marker_node(rid, write_ts)
+            for rid, write_ts in last_writes.items()
+            if written.get(rid) != write_ts
+        ]
 
-    def _get_resource_last_write(self, resource_id: str) -> Optional[str]:
+    def _resource_marker_node(self, resource_id: str, ts_iso: str) -> Dict[str, Any]:
+        """Build the Neo4j node row recording a resource's last write timestamp"""
+        content = {"last_write_ts": _canonical_ts(ts_iso)}
+        return {
+            "id": self._resource_node_id(resource_id),
+            "summary": f"Resource {resource_id}",
+            "content": json_codec.dumps(content),
+            # Also a top-level property, so validity checks don't parse content
+            "properties": content,
+        }
+
+    def _get_resource_last_write(self, resource_id: str, nodes: Optional[Dict[str, Dict]] = None) -> Optional[str]:
+        """Last write timestamp for a resource, read from a node snapshot if one is given"""
         node_id = self._resource_node_id(resource_id)
-        node = self.neo4j_service.get_node_by_metadata(self.workflow_id, node_id)
+        if nodes is not None:
+            node = nodes.get(node_id)
+        else:
+            node = self.neo4j_service.get_node_by_metadata(self.workflow_id, node_id)
         if not node:
             return None
+        if "last_write_ts" in node:
+            return node["last_write_ts"]
         try:
-            return json.loads(node.get("content") or "{}").get("last_write_ts")
+            # Markers written before the property existed
+            return json_codec.loads(node.get("content") or "{}").get("last_write_ts")
         except Exception:
             return None
 
-    def _delete_stale_reads_for_resource(self, resource_id: str, write_ts_iso: str) -> int:
+    def _delete_stale_reads_for_resources(self, resource_ids: Set[str], write_ts_iso: str) -> int:
         """
-        Delete cached READ episodes (and their summaries) that reference `resource_id`
-        and are OLDER than the given write timestamp.
+        Delete cached READ episodes (and their summaries) that reference any of
+        `resource_ids` and are OLDER than the given write timestamp.
+        Candidates come from one query and are deleted in one batch.
         Returns number of deleted episodes.
         """
-        deleted = 0
-        nodes = self.neo4j_service.get_all_nodes(self.workflow_id)
-
-        # parse write timestamp
-        try:
-            t_write = datetime.fromisoformat(write_ts_iso.replace("Z", "+00:00"))
-        except Exception:
+        # Stored timestamps are canonical UTC strings, so they compare without parsing
+        write_ts = _canonical_ts(write_ts_iso)
+        if not write_ts:
             # if write ts unparsable, skip purging to be safe
             return 0
 
-        READ_TYPES = {
-            "read_file_contents", "query_codebase",
-            "search_documentation", "search_internet",
-            "retrieve_integration_methods", "execute_command"
-        }
+        # Successful reads of the resources are filtered by Neo4j on node properties
+        candidates = self.neo4j_service.get_successful_nodes_by_resources(
+            self.workflow_id, list(resource_ids), list(_READ_TYPES)
+        )
 
-        for node in nodes:
-            nid = node["id"]
-            if not nid.startswith("tool_result_"):
-                continue
-            try:
-                content = json.loads(node.get("content") or "{}")
-            except Exception:
-                continue
+        deleted = 0
+        stale_node_ids: List[str] = []
+        for candidate in candidates:
+            nid = candidate["id"]
+            # if hit ts missing or bad (stored as ""), err on safety: delete
+            if (candidate.get("timestamp") or "") < write_ts:
+                # delete the summary node (if present) along with the episode node
+                stale_node_ids.append(_sum_key(_tool_id_from_key(nid)))
+                stale_node_ids.append(nid)
+                deleted += 1
 
-            atype = content.get("action_type", "")
-            status = (content.get("result", {}) or {}).get("status", "").lower()
-            ts = content.get("timestamp") or ""
-            cache = content.get("cache", {}) or {}
-            rids = cache.get("resource_ids") or []
+        if stale_node_ids:
+            self.neo4j_service.delete_nodes(self.workflow_id, stale_node_ids)
+        return deleted
 
-            if atype not in READ_TYPES:           # only purge reads
-                continue
-            if status != "success":
+
+    def plan_reuse(self, knowledge_entries: List[Dict[str, Any]]
+                   ) -> Tuple[List[Optional[Dict[str, Any]]], List[CacheFields]]:
+        """
+        Decide, in trace order, which entries can reuse an earlier result.
+        
+        Mirrors running preflight + add_tool_result one entry at a time, but
+        without writing anything, so the misses can be stored in one batch.
+        Entries are classified once up front; graph hits for every read come
+        from a single snapshot lookup.
+        Repeats of an earlier entry in the same batch are detected too, and
+        writes invalidate both graph hits and batch-local reads they touch.
+        Like add_tool_results_bulk, this assumes entry timestamps are
+        non-decreasing in list order: a write in the batch invalidates hits on
+        its resources without comparing timestamps, which is only what the
+        sequential path does when the write is not older than the hit.
+        
+        Returns:
+            Tuple of (plan, fields). plan has one item per entry:
+            - None: the entry must be stored
+            - {"tool_id", "text"}: reuse a result already in the graph
+            - {"source_index"}: reuse the entry at that index in this batch
+            fields holds each entry's cache fields; pass those of the entries
+            being stored to add_tool_results_bulk so keys aren't hashed twice.
+        """
+        fields = [self._cache_fields(entry) for entry in knowledge_entries]
+        read_indices = [i for i, (_, _, _, _, op_type) in enumerate(fields) if op_type == "read"]
+        graph_hits = self._lookup_cached(
+            {i: (fields[i][0], fields[i][1]) for i in read_indices},
+            tool_keys={i: fields[i][2] for i in read_indices},
+            resource_ids={i: fields[i][3] for i in read_indices},
+        )
+        plan: List[Optional[Dict[str, Any]]] = []
+        pending: Dict[str, Tuple[int, List[str]]] = {}  # tool_key -> (index, resource_ids)
+        written: Set[str] = set()                       # resources written in this batch
+
+        for i, entry in enumerate(knowledge_entries):
+            _, _, tool_key, resource_ids, op_type = fields[i]
+
+            if op_type == "write":
+                touched = set(resource_ids)
+                written |= touched
+                pending = {k: v for k, v in pending.items() if not touched & set(v[1])}
+                plan.append(None)
                 continue
-            if resource_id not in rids:
+
+            if tool_key in pending:
+                plan.append({"source_index": pending[tool_key][0]})
                 continue
 
-            try:
-                t_hit = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-            except Exception:
-                # if hit ts bad, err on safety: delete
-                t_hit = None
-
-            if t_hit is None or t_hit < t_write:
-                # delete summary node if present
-                tool_id = nid.replace("tool_result_", "")
-                self.neo4j_service.delete_node(self.workflow_id, f"summary_{tool_id}", force=True)
-                # delete the episode node
-                self.neo4j_service.delete_node(self.workflow_id, nid, force=True)
-                deleted += 1
+            cached = None
+            if not written & set(resource_ids):
+                cached = graph_hits.get(i)
+            plan.append(cached)
 
-        return deleted
+            status = ((entry.get("result", {}) or {}).get("status") or "").lower()
+            if cached is None and status == "success":
+                pending[tool_key] = (i, resource_ids)
 
+        return plan, fields
 
-    def preflight(self, action_type: str, action: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def preflight(self, action_type: str, action: Dict[str, Any],
+                  tool_key: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Check the graph for the most recent SUCCESS result with the same tool_key.
         If valid, return a lightweight dict the caller can render and SKIP making a new tool call.
+        
+        Callers that go on to add_tool_result on a miss can compute the key once
+        with make_tool_key and pass it to both.
         """
-        tool_key = self._make_tool_key(action_type, action)
+        tool_keys = {0: tool_key} if tool_key is not None else None
+        return self._lookup_cached({0: (action_type, action)}, tool_keys).get(0)
 
-        # We haven't added node properties for tool_key yet, so we scan existing nodes (v1).
-        # Later, we can store tool_key as a Node property and query it directly.
-        nodes = self.neo4j_service.get_all_nodes(self.workflow_id)
-        latest = None
+    def preflight_batch(self, knowledge_entries: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+        """
+        Run preflight for every READ-like entry against one snapshot of the graph.
+        
+        Args:
+            knowledge_entries: Tool execution entries from knowledge sequence
+            
+        Returns:
+            Dict mapping entry index -> {"tool_id", "text"} for entries with a valid cached result
+        """
+        lookups = {}
+        for i, entry in enumerate(knowledge_entries):
+            action_type = entry.get("action_type", "unknown")
+            action = entry.get("action", {}) or {}
+            if self._classify_op(action_type, action) == "read":
+                lookups[i] = (action_type, action)
+        return self._lookup_cached(lookups)
 
-        for node in nodes:
-            if not node["id"].startswith("tool_result_"):
-                continue
+    def _lookup_cached(self, lookups: Dict[Any, Tuple[str, Dict[str, Any]]],
+                       tool_keys: Optional[Dict[Any, str]] = None,
+                       resource_ids: Optional[Dict[Any, List[str]]] = None) -> Dict[Any, Dict[str, Any]]:
+        """
+        Resolve cached results for many (action_type, action) pairs.
+        Matching tool results are found by their tool_key property in one query;
+        summaries and resource markers of the hits are fetched in a second one.
+        Keys and resource ids already derived by the caller can be passed in
+        tool_keys / resource_ids.
+        """
+        if not lookups:
+            return {}
 
-            try:
-                content = json.loads(node.get("content", "{}"))
-            except Exception:
-                continue
+        tool_keys = tool_keys or {}
+        wanted = {key: tool_keys.get(key) or self._make_tool_key(action_type, action)
+                  for key, (action_type, action) in lookups.items()}
 
-            prior_action_type = content.get("action_type", "")
-            prior_action = content.get("action", {}) or {}
-            prior_status = (content.get("result", {}) or {}).get("status", "").lower()
-            prior_ts = content.get("timestamp") or ""
+        # Hits remembered in-process need no round-trip while still valid
+        hits = {}
+        for key, tool_key in list(wanted.items()):
+            remembered = self._recall_hit(tool_key)
+            if remembered is not None:
+                hits[key] = {"tool_id": remembered["tool_id"], "text": remembered["text"]}
+                del wanted[key]
+        if not wanted:
+            return hits
 
-            # We stored tool_key under content["cache"]["tool_key"] (see add_tool_result change below)
-            prior_cache = content.get("cache", {}) or {}
-            prior_key = prior_cache.get("tool_key")
+        # The latest successful result per tool_key comes from an indexed property lookup
+        found = self.neo4j_service.get_latest_successful_by_tool_keys(
+            self.workflow_id, list(set(wanted.values()))
+        )
+        latest_by_key: Dict[str, Dict[str, Any]] = {
+            tool_key: {
+                "node_id": node["id"],          # e.g., tool_result_TR-5
+                "tool_id": _tool_id_from_key(node["id"]),
+                "timestamp": node.get("timestamp") or "",
+            }
+            for tool_key, node in found.items()
+        }
 
-            if prior_action_type != action_type:
-                continue
-            if prior_status != "success":
+        # Summaries and resource markers of the hits are fetched together
+        related_ids = set()
+        resource_ids_by_key: Dict[Any, List[str]] = {}
+        known_resource_ids = resource_ids or {}
+        for key, tool_key in wanted.items():
+            latest = latest_by_key.get(tool_key)
+            if latest:
+                rids = known_resource_ids.get(key)
+                if rids is None:
+                    rids = self._action_resource_ids(*lookups[key])
+                resource_ids_by_key[key] = rids
+                related_ids.add(_sum_key(latest["tool_id"]))
+                related_ids.update(self._resource_node_id(rid) for rid in rids)
+        nodes = self.neo4j_service.get_nodes_by_metadatas(self.workflow_id, list(related_ids)) if related_ids else {}
+
+        for key, tool_key in wanted.items():
+            latest = latest_by_key.get(tool_key)
+            if not latest:
                 continue
-            if prior_key != tool_key:
+
+            # Basic validity: accept any prior SUCCESS with same key.
+            # (You can extend with TTL or write-invalidation later.)
+            action_type, action = lookups[key]
+            if not self._is_valid_cached_result(latest, action_type, action, nodes, resource_ids_by_key[key]):
                 continue
 
-            # Keep the latest one
-            if latest is None or (prior_ts and prior_ts > latest.get("timestamp", "")):
-                latest = {
-                    "node_id": node["id"],          # e.g., tool_result_TR-5
-                    "tool_id": node["id"].replace("tool_result_", ""),
-                    "timestamp": prior_ts,
-                }
+            # Prefer a summary+salient one-liner if available
+            summary_node = nodes.get(_sum_key(latest['tool_id']))
+            if summary_node:
+                line = self._format_summary_with_salient_data(self._load_summary_content(summary_node))
+            else:
+                line = f"Summary not available for {latest['tool_id']}"
 
-        if not latest:
-            return None
+            hits[key] = {"tool_id": latest["tool_id"], "text": line or f"Reused prior result for {action_type}"}
+            # Only remember hits whose text won't change once a summary is generated
+            if summary_node:
+                self._remember_hit(tool_key, latest, hits[key]["text"], resource_ids_by_key[key])
 
-        # Basic validity: accept any prior SUCCESS with same key.
-        # (You can extend with TTL or write-invalidation later.)
-        if not self._is_valid_cached_result(latest, action_type, action):
-            return None
+        return hits
 
-        # Prefer a summary+salient one-liner if available
-        line = self.retrieve_tool_result_with_salient_data(latest["tool_id"]) \
-               or self.retrieve_tool_result(latest["tool_id"], summary=True) \
-               or f"Reused prior result for {action_type}"
+    def _remember_hit(self, tool_key: str, latest: Dict[str, Any], text: str, resource_ids: List[str]) -> None:
+        """Store a validated reuse hit in the in-process LRU cache"""
+        cache = self._preflight_cache
+        cache[tool_key] = {
+            "tool_id": latest["tool_id"],
+            "text": text,
+            "timestamp": _canonical_ts(latest["timestamp"]),
+            "resource_ids": resource_ids,
+            "epoch": self._write_epoch,
+        }
+        cache.move_to_end(tool_key)
+        if len(cache) > PREFLIGHT_CACHE_SIZE:
+            cache.popitem(last=False)
 
-        return {"tool_id": latest["tool_id"], "text": line}
+    def _recall_hit(self, tool_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a remembered reuse hit, unless this process has since seen a write
+        to one of its resources (in which case it is dropped)
+        """
+        cache = self._preflight_cache
+        remembered = cache.get(tool_key)
+        if remembered is None:
+            return None
+        if remembered["epoch"] != self._write_epoch:
+            # Writes happened since this hit was last checked
+            write_ts = self._resource_write_ts
+            hit_ts = remembered["timestamp"]
+            if any(write_ts.get(rid, "") > hit_ts for rid in remembered["resource_ids"]):
+                del cache[tool_key]
+                return None
+            remembered["epoch"] = self._write_epoch
+        cache.move_to_end(tool_key)
+        return remembered
 
-    def _is_valid_cached_result(self, hit: Dict[str, Any], action_type: str, action: Dict[str, Any]) -> bool:
+    def _is_valid_cached_result(self, hit: Dict[str, Any], action_type: str, action: Dict[str, Any],
+                                nodes: Optional[Dict[str, Dict]] = None,
+                                resource_ids: Optional[List[str]] = None) -> bool:
         """
         TTL-free validity:
         Cached SUCCESS is valid iff NO newer WRITE occurred on ANY relevant resource_id.
+        The action's resource ids are derived here unless passed in.
         """
-        # parse cached read timestamp
-        try:
-            t_hit = datetime.fromisoformat(hit["timestamp"].replace("Z", "+00:00"))
-        except Exception:
+        # Canonical timestamps compare as strings; legacy formats are parsed once
+        t_hit = _canonical_ts(hit["timestamp"])
+        if not t_hit:
             return False
 
         # if we can map resources, enforce write-aware invalidation
-        norm_action = self._normalize_action(action)
-        resource_ids = self._extract_resource_ids(action_type, norm_action)
+        if resource_ids is None:
+            resource_ids = self._action_resource_ids(action_type, action)
         for rid in resource_ids:
-            last_write_ts = self._get_resource_last_write(rid)
+            last_write_ts = self._get_resource_last_write(rid, nodes)
             if last_write_ts:
-                try:
-                    t_write = datetime.fromisoformat(last_write_ts.replace("Z", "+00:00"))
-                    if t_write > t_hit:
-                        return False
-                except Exception:
+                t_write = _canonical_ts(last_write_ts)
+                if not t_write or t_write > t_hit:
                     return False
 
         # If there are no relevant resource ids 
@@ -1,14 +1,23 @@
-import json
+import asyncio
 import os
-import threading
+import weakref
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
 
 from langchain_openai import ChatOpenAI
+from openai import DefaultAsyncHttpxClient
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage, BaseMessage
 
+import json_codec
+from log_utils import get_logger
 
-@dataclass
+logger = get_logger(__name__)
+
+# LangChain message class per role; any other role is treated as the assistant
+_ROLE_CTORS = {"system": SystemMessage, "human": HumanMessage, "user": HumanMessage}
+
+
+@dataclass(slots=True)
 class Message:
     """Message structure for LLM communication"""
     role: str
@@ -36,8 +45,15 @@ class LLMService:
         else:
             self.max_tokens = 16384  # Safe default
         self.temperature = 0.0
+        # ChatOpenAI clients (and their HTTP connection pools) reused across calls, keyed by json_mode
+        self._clients: Dict[bool, ChatOpenAI] = {}
+        # Async connection pools are bound to the event loop they were opened on,
+        # so ainvoke clients are kept per running loop (dropped with the loop)
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[bool, ChatOpenAI]]" = (
+            weakref.WeakKeyDictionary()
+        )
     
-    def _make_client(self, json_mode: bool = False) -> ChatOpenAI:
+    def _make_client(self, json_mode: bool = False, http_async_client=None) -> ChatOpenAI:
         """Creates and configures a new ChatOpenAI client instance"""
         model_kwargs: Dict[str, Any] = (
             {"response_format": {"type": "json_object"}} if json_mode else {}
@@ -50,56 +66,106 @@ class LLMService:
             streaming=False,
             max_tokens=self.max_tokens,
         )
+        if http_async_client is not None:
+            init_kwargs["http_async_client"] = http_async_client
         
         return ChatOpenAI(model_kwargs=model_kwargs, **init_kwargs)
     
+    def _client(self, json_mode: bool) -> ChatOpenAI:
+        """Shared client for the given mode, created on first use"""
+        client = self._clients.get(json_mode)
+        if client is None:
+            client = self._clients[json_mode] = self._make_client(json_mode=json_mode)
+        return client
+    
+    def _async_client(self, json_mode: bool) -> ChatOpenAI:
+        """Client for the running event loop and mode, with its own async connection pool"""
+        clients = self._async_clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(json_mode)
+        if client is None:
+            client = clients[json_mode] = self._make_client(
+                json_mode=json_mode, http_async_client=DefaultAsyncHttpxClient()
+            )
+        return client
+    
     def _lc_messages(self, msgs: List[Message]) -> List[BaseMessage]:
         """Convert our Message objects to LangChain messages"""
-        out: List[BaseMessage] = []
-        for m in msgs:
-            if m.role == "system":
-                out.append(SystemMessage(content=m.content))
-            elif m.role in ("human", "user"):
-                out.append(HumanMessage(content=m.content))
-            else:
-                out.append(AIMessage(content=m.content))
-        return out
+        ctors = _ROLE_CTORS
+        return [ctors.get(m.role, AIMessage)(content=m.content) for m in msgs]
     
     def generate(self, messages: List[Message], json_mode: bool = False) -> str:
         """Generate response from LLM"""
         lc_msgs = self._lc_messages(messages)
-        client = self._make_client(json_mode=json_mode)
+        client = self._client(json_mode)
         
-        print(f"[{threading.current_thread().name}] LLMService → invoke (json_mode={json_mode})")
+        logger.debug("LLMService → invoke (json_mode=%s)", json_mode)
         
         try:
             resp = client.invoke(lc_msgs)
             text = resp.content
             
-            print(f"[{threading.current_thread().name}] LLMService ← {len(text):,} chars in {self.model}")
+            logger.debug("LLMService ← %d chars in %s", len(text), self.model)
+            
+            return self._extract_response(text, json_mode)
+            
+        except Exception as e:
+            raise Exception(f"LLM generation failed: {str(e)}")
+    
+    async def agenerate(self, messages: List[Message], json_mode: bool = False) -> str:
+        """Generate response from LLM without blocking the event loop"""
+        lc_msgs = self._lc_messages(messages)
+        client = self._async_client(json_mode)
+        
+        logger.debug("LLMService → ainvoke (json_mode=%s)", json_mode)
+        
+        try:
+            resp = await client.ainvoke(lc_msgs)
+            text = resp.content
             
-            # JSON extraction if requested
-            if json_mode:
-                start, end = text.find("{"), text.rfind("}")
-                if start < 0 or end < 0 or start > end:
-                    raise ValueError("No JSON object found in LLM response")
-                return text[start : end + 1]
+            logger.debug("LLMService ← %d chars in %s", len(text), self.model)
             
-            return text
+            return self._extract_response(text, json_mode)
             
         except Exception as e:
             raise Exception(f"LLM generation failed: {str(e)}")
     
-    def generate_summary(self, tool_content: Dict[str, Any], prompt: str) -> Dict[str, Any]:
-        """Generate summary for tool content using specified prompt"""
-        messages = [
+    def _extract_response(self, text: str, json_mode: bool) -> str:
+        """Return the response text, trimmed to the JSON object if requested"""
+        if json_mode:
+            start, end = text.find("{"), text.rfind("}")
+            if start < 0 or end < 0 or start > end:
+                raise ValueError("No JSON object found in LLM response")
+            return text[start : end + 1]
+        
+        return text
+    
+    def _summary_messages(self, tool_content: Dict[str, Any], prompt: str) -> List[Message]:
+        """Build the summarization conversation for a tool result"""
+        return [
             Message(role="system", content=prompt),
-            Message(role="user", content=json.dumps(tool_content, indent=2))
+            Message(role="user", content=json_codec.dumps(tool_content, indent=True))
         ]
+    
+    def generate_summary(self, tool_content: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+        """Generate summary for tool content using specified prompt"""
+        messages = self._summary_messages(tool_content, prompt)
         
         try:
             response = self.generate(messages, json_mode=True)
-            return json.loads(response)
+            return json_codec.loads(response)
+        except Exception as e:
+            return {
+                "summary": f"Summary generation failed: {str(e)}",
+                "salient_data": None
+            }
+    
+    async def agenerate_summary(self, tool_content: Dict[str, Any], prompt: str) -> Dict[str, Any]:
+        """Async variant of generate_summary for concurrent summarization"""
+        messages = self._summary_messages(tool_content, prompt)
+        
+        try:
+            response = await self.agenerate(messages, json_mode=True)
+            return json_codec.loads(response)
         except Exception as e:
             return {
                 "summary": f"Summary generation failed: {str(e)}",
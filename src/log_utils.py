@@ -0,0 +1,75 @@
+import logging
+import sys
+from termcolor import colored
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    StreamHandler that always writes to the current sys.stdout.
+
+    Resolving the stream at emit time keeps log lines in order with print()
+    output, including when stdout is redirected after the logger is created.
+    """
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class _ColorFormatter(logging.Formatter):
+    """
+    Formatter that colors messages by level, only when stdout is a terminal.
+
+    The isatty() check is cached per stream object, so piped or redirected
+    output gets plain text without a syscall per message.
+    """
+
+    LEVEL_COLORS = {
+        logging.DEBUG: "cyan",
+        logging.INFO: "green",
+        logging.WARNING: "yellow",
+        logging.ERROR: "red",
+        logging.CRITICAL: "red",
+    }
+
+    def __init__(self):
+        super().__init__("%(message)s")
+        self._stream = None
+        self._use_color = False
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        stream = sys.stdout
+        if stream is not self._stream:
+            self._stream = stream
+            self._use_color = bool(getattr(stream, "isatty", lambda: False)())
+        color = self.LEVEL_COLORS.get(record.levelno)
+        return colored(message, color) if self._use_color and color else message
+
+
+def get_logger(name: str, level: int = logging.INFO) -> logging.Logger:
+    """
+    Get a logger that prints plain messages to stdout, colored by level on a TTY.
+
+    Messages use %-style arguments, which logging only formats when the
+    level is enabled.
+
+    Args:
+        name (str): Logger name, usually __name__
+        level (int): Minimum level emitted
+
+    Returns:
+        logging.Logger: Configured logger
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = _StdoutHandler()
+        handler.setFormatter(_ColorFormatter())
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+    return logger
@@ -25,7 +25,7 @@ class RelationshipType(str, Enum):
     COMPRESSES = "compresses"
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolResult:
     """Represents a tool execution result"""
     tool_id: str
@@ -39,7 +39,7 @@ class ToolResult:
     compressed_summary: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolExecution:
     """Represents a complete tool execution"""
     tool_id: str
@@ -49,7 +49,7 @@ class ToolExecution:
     timestamp: datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class CompressedToolResult:
     """Represents a compressed tool execution result"""
     tool_id: str
@@ -59,7 +59,7 @@ class CompressedToolResult:
     compressed_token_count: int
 
 
-@dataclass
+@dataclass(slots=True)
 class ToolSummary:
     """Represents a summary of a tool result"""
     tool_id: str
@@ -79,16 +79,26 @@ class KnowledgeGraph(BaseModel):
         if depth <= 0:
             return []
 
+        # edges is keyed by source, so it already is the outgoing adjacency index:
+        # each step is one dict lookup per frontier node instead of a scan of all edges
+        edges = self.edges
         neighbors = set()
-        current_level = {metadata}
+        expanded = set()
+        current_level = [metadata]
 
         for _ in range(depth):
-            next_level = set()
-            for source_meta, (target_meta, relationship, description) in self.edges.items():
-                for curr_node in current_level:
-                    if source_meta == curr_node:
-                        next_level.add(target_meta)
-            neighbors.update(next_level)
+            next_level = []
+            for curr_node in current_level:
+                if curr_node in expanded:
+                    continue
+                expanded.add(curr_node)
+                edge = edges.get(curr_node)
+                if edge is not None:
+                    target_meta = edge[0]
+                    neighbors.add(target_meta)
+                    next_level.append(target_meta)
+            if not next_level:
+                break
             current_level = next_level
 
-        return list(neighbors) 
\ No newline at end of file
+        return list(neighbors)
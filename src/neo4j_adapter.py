@@ -23,11 +23,13 @@ class Neo4jAdapter:
                 "Pass `auth=` or set NEO4J_USERNAME and NEO4J_PASSWORD environment variables."
             )
         
-        # Verify connectivity
-        with GraphDatabase.driver(uri, auth=auth) as driver:
-            driver.verify_connectivity()
-        
+        # One driver (and its connection pool) serves both the connectivity check and all queries
         self.driver = GraphDatabase.driver(uri, auth=auth)
+        try:
+            self.driver.verify_connectivity()
+        except Exception:
+            self.driver.close()
+            raise
     
     def close(self):
         """Close the database connection"""
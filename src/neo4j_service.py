@@ -1,9 +1,64 @@
 import os
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+import json_codec
 from neo4j_adapter import Neo4jAdapter
 from models import RelationshipType
 
 
+def _relation_label(relation_type: RelationshipType) -> str:
+    """Cypher relationship type for a RelationshipType (labels can't be query parameters)"""
+    return relation_type.value.upper().replace(" ", "_")
+
+
+# Edge upsert queries are built once per relationship type, so the Cypher text
+# is identical across calls and nothing is formatted per edge
+_EDGE_QUERIES: Dict[RelationshipType, str] = {
+    relation_type: f"""
+        MATCH (a:Node {{id: $source_metadata}})
+        MATCH (b:Node {{id: $target_metadata}})
+        MERGE (a)-[r:{_relation_label(relation_type)}]->(b)
+        SET  r.source_metadata  = $source_metadata,
+             r.target_metadata  = $target_metadata,
+             r.relation_type    = $relation_type_str,
+             r.description      = $description,
+             r.workflow_id      = $workflow_id
+    """
+    for relation_type in RelationshipType
+}
+
+_EDGE_BULK_QUERIES: Dict[RelationshipType, str] = {
+    relation_type: f"""
+        UNWIND $rows AS row
+        MATCH (a:Node {{id: row.source}})
+        MATCH (b:Node {{id: row.target}})
+        MERGE (a)-[r:{_relation_label(relation_type)}]->(b)
+        SET  r.source_metadata  = row.source,
+             r.target_metadata  = row.target,
+             r.relation_type    = $relation_type_str,
+             r.description      = row.description,
+             r.workflow_id      = $workflow_id
+    """
+    for relation_type in RelationshipType
+}
+
+
+def _decode_json_fields(record: Dict, fields: Tuple[str, ...]) -> Dict:
+    """Parse the JSON-encoded properties of a stored record back into Python objects"""
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, str):
+            try:
+                record[field] = json_codec.loads(value)
+            except ValueError:
+                pass  # stored before these fields were JSON-encoded; keep the raw text
+    return record
+
+
+# Max entries kept by each of the ToolResult / CompressedResult read caches
+RESULT_CACHE_SIZE = 1024
+
+
 class Neo4jService:
     """Service for Neo4j database operations"""
     
@@ -11,6 +66,27 @@ class Neo4jService:
         uri = os.getenv("NEO4J_URI")
         auth = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
         self.adapter = Neo4jAdapter(uri, auth)
+        # Read-through LRU caches for get_tool_result / get_compressed_result,
+        # invalidated by this service's own writes and deletes
+        self._tool_result_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._compressed_cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self.ensure_indexes()
+
+    def ensure_indexes(self):
+        """Create the indexes used by node and tool-result lookups if they don't exist yet"""
+        queries = [
+            "CREATE INDEX node_workflow_id IF NOT EXISTS FOR (n:Node) ON (n.workflow_id, n.id)",
+            "CREATE INDEX node_workflow_action_type IF NOT EXISTS FOR (n:Node) ON (n.workflow_id, n.action_type)",
+            "CREATE INDEX node_workflow_status IF NOT EXISTS FOR (n:Node) ON (n.workflow_id, n.status)",
+            "CREATE INDEX node_workflow_tool_key IF NOT EXISTS FOR (n:Node) ON (n.workflow_id, n.tool_key)",
+            "CREATE INDEX node_workflow_counter IF NOT EXISTS FOR (n:Node) ON (n.workflow_id, n.counter)",
+            "CREATE INDEX tool_result_id IF NOT EXISTS FOR (t:ToolResult) ON (t.id)",
+            "CREATE INDEX compressed_result_id IF NOT EXISTS FOR (c:CompressedResult) ON (c.id)",
+            "CREATE CONSTRAINT workflow_counter_id IF NOT EXISTS FOR (c:WorkflowCounter) REQUIRE c.workflow_id IS UNIQUE",
+        ]
+        with self.adapter.driver.session() as session:
+            for query in queries:
+                session.run(query).consume()
 
     def close(self):
         """Close the database connection"""
@@ -29,13 +105,15 @@ class Neo4jService:
         except Exception as e:
             raise Exception(f"Neo4j connection test failed: {str(e)}")
 
-    def update_node(self, metadata: str, summary: str, content: str, workflow_id: str):
-        """Create or update a node in the graph"""
+    def update_node(self, metadata: str, summary: str, content: str, workflow_id: str,
+                    properties: Dict = None):
+        """Create or update a node in the graph, with optional extra top-level properties"""
         query = """
         MERGE (n:Node {id: $id})
         SET n.summary = $summary,
             n.content = $content,
             n.workflow_id = $workflow_id
+        SET n += $properties
         """
         with self.adapter.driver.session() as session:
             session.write_transaction(
@@ -44,10 +122,63 @@ class Neo4jService:
                     id=metadata, 
                     summary=summary, 
                     content=content, 
-                    workflow_id=workflow_id
+                    workflow_id=workflow_id,
+                    properties=properties or {}
                 )
             )
 
+    def update_nodes_bulk(self, nodes: List[Dict], workflow_id: str):
+        """Create or update many nodes in a single transaction"""
+        with self.adapter.driver.session() as session:
+            session.write_transaction(self._merge_nodes, nodes, workflow_id)
+
+    def update_edges_bulk(self, edges: List[Dict], workflow_id: str):
+        """
+        Create or update many edges in a single transaction (one UNWIND per relationship type).
+        Edges are {source, target, relation_type, description}.
+        """
+        with self.adapter.driver.session() as session:
+            session.write_transaction(self._merge_edges, edges, workflow_id)
+
+    def update_graph_bulk(self, nodes: List[Dict], edges: List[Dict], workflow_id: str):
+        """
+        Create or update many nodes and then edges between them in a single transaction.
+        Nodes are {id, summary, content, properties?}; edges are {source, target, relation_type, description}.
+        """
+        def write_all(tx):
+            self._merge_nodes(tx, nodes, workflow_id)
+            self._merge_edges(tx, edges, workflow_id)
+
+        with self.adapter.driver.session() as session:
+            session.write_transaction(write_all)
+
+    @staticmethod
+    def _merge_nodes(tx, nodes: List[Dict], workflow_id: str):
+        query = """
+        UNWIND $nodes AS row
+        MERGE (n:Node {id: row.id})
+        SET n.summary = row.summary,
+            n.content = row.content,
+            n.workflow_id = $workflow_id
+        SET n += coalesce(row.properties, {})
+        """
+        tx.run(query, nodes=nodes, workflow_id=workflow_id)
+
+    @staticmethod
+    def _merge_edges(tx, edges: List[Dict], workflow_id: str):
+        # Relationship types can't be parameterized, so run one UNWIND per type
+        by_type: Dict[RelationshipType, List[Dict]] = {}
+        for edge in edges:
+            by_type.setdefault(edge["relation_type"], []).append({
+                "source": edge["source"],
+                "target": edge["target"],
+                "description": edge["description"],
+            })
+
+        for relation_type, rows in by_type.items():
+            query = _EDGE_BULK_QUERIES[relation_type]
+            tx.run(query, rows=rows, relation_type_str=relation_type.value, workflow_id=workflow_id)
+
     def update_edge(
         self,
         source_metadata: str,
@@ -57,18 +188,8 @@ class Neo4jService:
         workflow_id: str
     ):
         """Create or update an edge between two nodes"""
-        sanitized_relation = relation_type.value.upper().replace(" ", "_")
-
-        query = f"""
-            MATCH (a:Node {{id: $source_metadata}})
-            MATCH (b:Node {{id: $target_metadata}})
-            MERGE (a)-[r:{sanitized_relation}]->(b)
-            SET  r.source_metadata  = $source_metadata,
-                 r.target_metadata  = $target_metadata,
-                 r.relation_type    = $relation_type_str,
-                 r.description      = $description,
-                 r.workflow_id      = $workflow_id
-        """
+        query = _EDGE_QUERIES[relation_type]
+
         with self.adapter.driver.session() as session:
             session.write_transaction(
                 lambda tx: tx.run(
@@ -97,6 +218,16 @@ class Neo4jService:
                 """
             session.write_transaction(lambda tx: tx.run(query, id=metadata, wid=workflow_id))
 
+    def delete_nodes(self, workflow_id: str, metadatas: List[str]):
+        """Delete several nodes (and their relationships) by metadata ID in one transaction"""
+        query = """
+        UNWIND $node_ids AS node_id
+        MATCH (n:Node {id: node_id, workflow_id: $wid})
+        DETACH DELETE n
+        """
+        with self.adapter.driver.session() as session:
+            session.write_transaction(lambda tx: tx.run(query, node_ids=list(metadatas), wid=workflow_id))
+
     def delete_edge(self, workflow_id: str, source_metadata: str, target_metadata: str):
         """Delete an edge between two nodes"""
         query = """
@@ -127,21 +258,129 @@ class Neo4jService:
         """Get all edges in the workflow"""
         query = """
         MATCH (a:Node {workflow_id: $wid})-[r]->(b:Node {workflow_id: $wid})
-        RETURN a, r, b
+        RETURN a.id AS source, b.id AS target,
+               r.relation_type AS relation_type, r.description AS description
+        """
+        with self.adapter.driver.session() as session:
+            return session.read_transaction(
+                lambda tx: [record.data() for record in tx.run(query, wid=workflow_id)]
+            )
+
+    def get_graph_snapshot(self, workflow_id: str) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Get all nodes and edges in the workflow in one round-trip, shaped like
+        get_all_nodes and get_all_edges
+        """
+        query = """
+        MATCH (n:Node {workflow_id: $wid})
+        WITH collect(properties(n)) AS nodes
+        RETURN nodes,
+               [(a:Node {workflow_id: $wid})-[r]->(b:Node {workflow_id: $wid}) | {
+                   source: a.id,
+                   target: b.id,
+                   relation_type: r.relation_type,
+                   description: r.description
+               }] AS edges
+        """
+        with self.adapter.driver.session() as session:
+            def fetch_snapshot(tx):
+                rec = tx.run(query, wid=workflow_id).single()
+                if not rec:
+                    return [], []
+                return [dict(node) for node in rec["nodes"]], [dict(edge) for edge in rec["edges"]]
+            return session.read_transaction(fetch_snapshot)
+
+    def iter_nodes_by_prefix(self, workflow_id: str, prefix: str) -> Iterator[Dict]:
+        """
+        Stream nodes whose ID is prefix + integer counter, ordered by that counter
+        (the stored counter property when present), yielding each node as its
+        record arrives instead of materializing the list
+        """
+        query = """
+        MATCH (n:Node {workflow_id: $wid})
+        WHERE n.id STARTS WITH $prefix
+        RETURN n
+        ORDER BY coalesce(n.counter, toInteger(substring(n.id, size($prefix))))
+        """
+        with self.adapter.driver.session() as session:
+            for record in session.run(query, wid=workflow_id, prefix=prefix):
+                yield dict(record["n"])
+
+    def get_tool_result_rows(self, workflow_id: str, prefix: str, keys: List[str],
+                             skip_content_ids: List[str]) -> List[Dict]:
+        """
+        Get the given properties (plus id and content) of nodes whose ID is prefix +
+        integer counter, ordered by that counter, in one query.
+        Content is left out (None) for nodes in skip_content_ids that have all the
+        requested properties, so rows rendered from properties alone transfer no content.
+        """
+        query = """
+        MATCH (n:Node {workflow_id: $wid})
+        WHERE n.id STARTS WITH $prefix
+        RETURN n.id AS id, [key IN $keys | n[key]] AS values,
+               CASE WHEN n.id IN $skip_content_ids AND all(key IN $keys WHERE n[key] IS NOT NULL)
+                    THEN null ELSE n.content END AS content
+        ORDER BY coalesce(n.counter, toInteger(substring(n.id, size($prefix))))
         """
         with self.adapter.driver.session() as session:
             return session.read_transaction(
                 lambda tx: [
-                    {
-                        "source": record["a"]["id"],
-                        "target": record["b"]["id"],
-                        "relation_type": record["r"].get("relation_type"),
-                        "description": record["r"].get("description")
-                    }
-                    for record in tx.run(query, wid=workflow_id)
+                    {"id": record["id"], **dict(zip(keys, record["values"])), "content": record["content"]}
+                    for record in tx.run(query, wid=workflow_id, prefix=prefix, keys=keys,
+                                         skip_content_ids=list(skip_content_ids))
                 ]
             )
 
+    def get_nodes_missing_property(self, workflow_id: str, prefix: str, key: str) -> List[Dict]:
+        """Get nodes whose ID starts with prefix that have no value for property key"""
+        query = """
+        MATCH (n:Node {workflow_id: $wid})
+        WHERE n.id STARTS WITH $prefix AND n[$key] IS NULL
+        RETURN n
+        """
+        with self.adapter.driver.session() as session:
+            return session.read_transaction(
+                lambda tx: [dict(record["n"]) for record in tx.run(query, wid=workflow_id, prefix=prefix, key=key)]
+            )
+
+    def get_max_counter_by_prefix(self, workflow_id: str, prefix: str) -> int:
+        """Get the highest integer counter among node IDs of the form prefix + n (0 if none)"""
+        query = """
+        MATCH (n:Node {workflow_id: $wid})
+        WHERE n.id STARTS WITH $prefix
+        RETURN max(coalesce(n.counter, toInteger(substring(n.id, size($prefix))))) AS max_counter
+        """
+        with self.adapter.driver.session() as session:
+            def fetch_max(tx):
+                rec = tx.run(query, wid=workflow_id, prefix=prefix).single()
+                return (rec["max_counter"] if rec else None) or 0
+            return session.read_transaction(fetch_max)
+
+    def get_tool_counter(self, workflow_id: str) -> Optional[int]:
+        """Get the workflow's stored tool counter (None if no counter exists yet)"""
+        query = "MATCH (c:WorkflowCounter {workflow_id: $wid}) RETURN c.tool_counter AS tool_counter"
+        with self.adapter.driver.session() as session:
+            def fetch_counter(tx):
+                rec = tx.run(query, wid=workflow_id).single()
+                return rec["tool_counter"] if rec else None
+            return session.read_transaction(fetch_counter)
+
+    def increment_tool_counter(self, workflow_id: str, count: int = 1, initial: int = 0) -> int:
+        """
+        Atomically add count to the workflow's tool counter and return the new value.
+        The counter node is created starting from initial if it doesn't exist yet.
+        """
+        query = """
+        MERGE (c:WorkflowCounter {workflow_id: $wid})
+        ON CREATE SET c.tool_counter = $initial
+        SET c.tool_counter = c.tool_counter + $count
+        RETURN c.tool_counter AS tool_counter
+        """
+        with self.adapter.driver.session() as session:
+            return session.write_transaction(
+                lambda tx: tx.run(query, wid=workflow_id, count=count, initial=initial).single()["tool_counter"]
+            )
+
     def get_node_by_metadata(self, workflow_id: str, metadata: str) -> Dict:
         """Get a node by its metadata ID"""
         query = "MATCH (n:Node {id: $node_id, workflow_id: $wid}) RETURN n"
@@ -152,20 +391,104 @@ class Neo4jService:
                 return dict(rec["n"]) if rec else None
             return session.read_transaction(fetch_one)
 
+    def get_nodes_by_metadatas(self, workflow_id: str, metadatas: List[str]) -> Dict[str, Dict]:
+        """Get several nodes by metadata ID in one query, keyed by ID (missing IDs are omitted)"""
+        query = """
+        UNWIND $node_ids AS node_id
+        MATCH (n:Node {id: node_id, workflow_id: $wid})
+        RETURN n
+        """
+        with self.adapter.driver.session() as session:
+            return session.read_transaction(
+                lambda tx: {
+                    record["n"]["id"]: dict(record["n"])
+                    for record in tx.run(query, node_ids=list(metadatas), wid=workflow_id)
+                }
+            )
+
+    def get_latest_successful_by_tool_keys(self, workflow_id: str, tool_keys: List[str]) -> Dict[str, Dict]:
+        """
+        Get the most recent successful tool-result node for each tool_key property,
+        keyed by tool_key as {id, timestamp} (keys without a match are omitted)
+        """
+        query = """
+        UNWIND $tool_keys AS tool_key
+        MATCH (n:Node {workflow_id: $wid, tool_key: tool_key})
+        WHERE toLower(n.status) = 'success'
+        WITH tool_key, n
+        ORDER BY n.timestamp DESC
+        WITH tool_key, collect(n)[0] AS latest
+        RETURN tool_key, latest.id AS id, latest.timestamp AS timestamp
+        """
+        with self.adapter.driver.session() as session:
+            return session.read_transaction(
+                lambda tx: {
+                    record["tool_key"]: {"id": record["id"], "timestamp": record["timestamp"]}
+                    for record in tx.run(query, tool_keys=list(tool_keys), wid=workflow_id)
+                }
+            )
+
+    def get_successful_nodes_by_resources(self, workflow_id: str, resource_ids: List[str],
+                                          action_types: List[str]) -> List[Dict]:
+        """
+        Get {id, timestamp} of successful tool-result nodes of the given action types
+        whose resource_ids property contains any of resource_ids
+        """
+        query = """
+        MATCH (n:Node {workflow_id: $wid})
+        WHERE n.action_type IN $action_types
+          AND toLower(n.status) = 'success'
+          AND any(rid IN n.resource_ids WHERE rid IN $resource_ids)
+        RETURN n.id AS id, n.timestamp AS timestamp
+        """
+        with self.adapter.driver.session() as session:
+            return session.read_transaction(
+                lambda tx: [
+                    {"id": record["id"], "timestamp": record["timestamp"]}
+                    for record in tx.run(query, wid=workflow_id, resource_ids=list(resource_ids),
+                                         action_types=list(action_types))
+                ]
+            )
+
     def reset_graph_by_workflow(self, workflow_id: str) -> None:
-        """Delete all nodes and relationships for a workflow"""
+        """Delete all nodes and relationships for a workflow, including its tool counter"""
         query = """
         MATCH (n:Node {workflow_id: $wid})
         DETACH DELETE n
         """
+        counter_query = "MATCH (c:WorkflowCounter {workflow_id: $wid}) DELETE c"
+
+        def delete_all(tx):
+            tx.run(query, wid=workflow_id)
+            tx.run(counter_query, wid=workflow_id)
+
         with self.adapter.driver.session() as session:
-            session.write_transaction(lambda tx: tx.run(query, wid=workflow_id))
+            session.write_transaction(delete_all)
 
     def reset_entire_graph(self) -> None:
         """Delete all nodes and relationships in the entire database"""
         query = "MATCH (n) DETACH DELETE n"
         with self.adapter.driver.session() as session:
             session.write_transaction(lambda tx: tx.run(query))
+        self._tool_result_cache.clear()
+        self._compressed_cache.clear()
+
+    @staticmethod
+    def _cache_get(cache: "OrderedDict[str, Dict]", key: str) -> Optional[Dict]:
+        """Get a copy of a cached record, marking it most recently used"""
+        record = cache.get(key)
+        if record is None:
+            return None
+        cache.move_to_end(key)
+        return dict(record)
+
+    @staticmethod
+    def _cache_put(cache: "OrderedDict[str, Dict]", key: str, record: Dict) -> None:
+        """Cache a copy of a record, evicting the least recently used entry when full"""
+        cache[key] = dict(record)
+        cache.move_to_end(key)
+        if len(cache) > RESULT_CACHE_SIZE:
+            cache.popitem(last=False)
 
     # Additional methods for tool result operations
     def store_tool_result(self, tool_id: str, tool_result) -> Dict:
@@ -189,16 +512,20 @@ class Neo4jService:
                     status=tool_result.status,
                     output=str(tool_result.result.get("output", "")),
                     action_type=tool_result.action_type,
-                    action=str(tool_result.action),
-                    result=str(tool_result.result),
+                    action=json_codec.dumps(tool_result.action),
+                    result=json_codec.dumps(tool_result.result),
                     timestamp=tool_result.timestamp,
                     token_count=tool_result.token_count
                 )
             )
-            return {"tool_id": tool_id, "status": "stored"}
+        self._tool_result_cache.pop(tool_id, None)
+        return {"tool_id": tool_id, "status": "stored"}
 
     def get_tool_result(self, tool_id: str) -> Dict:
-        """Get a tool result by ID"""
+        """Get a tool result by ID, served from the in-process cache on repeat fetches"""
+        cached = self._cache_get(self._tool_result_cache, tool_id)
+        if cached is not None:
+            return _decode_json_fields(cached, ("action", "result"))
         query = "MATCH (t:ToolResult {id: $tool_id}) RETURN t"
         with self.adapter.driver.session() as session:
             def fetch_tool(tx):
@@ -206,7 +533,11 @@ class Neo4jService:
                 record = result.single()
                 return dict(record["t"]) if record else None
             
-            return session.read_transaction(fetch_tool)
+            tool = session.read_transaction(fetch_tool)
+        if tool is not None:
+            self._cache_put(self._tool_result_cache, tool_id, tool)
+            _decode_json_fields(tool, ("action", "result"))
+        return tool
 
     def store_compressed_result(self, compressed_result) -> Dict:
         """Store a compressed tool result"""
@@ -224,15 +555,19 @@ class Neo4jService:
                     query,
                     tool_id=compressed_result.tool_id,
                     summary=compressed_result.summary,
-                    salient_data=str(compressed_result.salient_data) if compressed_result.salient_data else None,
+                    salient_data=json_codec.dumps(compressed_result.salient_data) if compressed_result.salient_data else None,
                     original_token_count=compressed_result.original_token_count,
                     compressed_token_count=compressed_result.compressed_token_count
                 )
             )
-            return {"tool_id": compressed_result.tool_id, "status": "stored"}
+        self._compressed_cache.pop(compressed_result.tool_id, None)
+        return {"tool_id": compressed_result.tool_id, "status": "stored"}
 
     def get_compressed_result(self, tool_id: str) -> Dict:
-        """Get a compressed tool result by ID"""
+        """Get a compressed tool result by ID, served from the in-process cache on repeat fetches"""
+        cached = self._cache_get(self._compressed_cache, tool_id)
+        if cached is not None:
+            return _decode_json_fields(cached, ("salient_data",))
         query = "MATCH (c:CompressedResult {id: $tool_id}) RETURN c"
         with self.adapter.driver.session() as session:
             def fetch_compressed(tx):
@@ -240,7 +575,11 @@ class Neo4jService:
                 record = result.single()
                 return dict(record["c"]) if record else None
             
-            return session.read_transaction(fetch_compressed)
+            compressed = session.read_transaction(fetch_compressed)
+        if compressed is not None:
+            self._cache_put(self._compressed_cache, tool_id, compressed)
+            _decode_json_fields(compressed, ("salient_data",))
+        return compressed
 
     def create_relationship(self, source_id: str, target_id: str, relationship_type: str, description: str) -> Dict:
         """Create a relationship between two tool results"""
@@ -279,15 +618,16 @@ class Neo4jService:
 
     def delete_tool_result(self, tool_id: str) -> Dict:
         """Delete a tool result and its compressed version"""
+        # One statement and transaction for both labels; either node may be missing
         query = """
-        MATCH (t:ToolResult {id: $tool_id})
+        OPTIONAL MATCH (t:ToolResult {id: $tool_id})
         DETACH DELETE t
-        """
-        query2 = """
-        MATCH (c:CompressedResult {id: $tool_id})
+        WITH count(*) AS _
+        OPTIONAL MATCH (c:CompressedResult {id: $tool_id})
         DETACH DELETE c
         """
         with self.adapter.driver.session() as session:
-            session.write_transaction(lambda tx: tx.run(query, tool_id=tool_id))
-            session.write_transaction(lambda tx: tx.run(query2, tool_id=tool_id))
-            return {"tool_id": tool_id, "status": "deleted"} 
\ No newline at end of file
+            session.write_transaction(lambda tx: tx.run(query, tool_id=tool_id).consume())
+        self._tool_result_cache.pop(tool_id, None)
+        self._compressed_cache.pop(tool_id, None)
+        return {"tool_id": tool_id, "status": "deleted"} 
\ No newline at end of file
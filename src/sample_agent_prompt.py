@@ -1,3 +1,6 @@
+import string
+from typing import Any, List, Optional, Tuple
+
 PROMPT = """
 <role>
 You are a DevOps Supervisor responsible for completing a workflow plan by directly choosing and executing specific tools.
@@ -180,4 +183,31 @@ Detailed Tool Execution Dashboard (contains all tool executions with input/outpu
 {tool_dashboard}
 </current_execution_context>
 
-"""
\ No newline at end of file
+"""
+
+
+# PROMPT split once into (literal text, field name) pairs; "{{"/"}}" escapes are
+# already resolved in the literals, so render() never re-parses the template
+_PROMPT_PARTS: List[Tuple[str, Optional[str]]] = [
+    (literal, field_name) for literal, field_name, _, _ in string.Formatter().parse(PROMPT)
+]
+
+
+def render(**context: Any) -> str:
+    """
+    Fill the PROMPT placeholders, equivalent to PROMPT.format(**context).
+    
+    Args:
+        **context: Value for each placeholder (configured_integrations, integration_methods,
+            detected_languages, plan_steps, tool_dashboard)
+    
+    Returns:
+        str: Rendered prompt
+    """
+    parts: List[str] = []
+    append = parts.append
+    for literal, field_name in _PROMPT_PARTS:
+        append(literal)
+        if field_name is not None:
+            append(str(context[field_name]))
+    return "".join(parts)
@@ -22,15 +22,22 @@ Example:
     --burst-len 3 \
     --hotset-frac 0.4 \
     --hotset-weight 0.75 \
-    --seed 42
+    --seed 42 \
+    --pretty
 """
 
 import argparse
+import functools
 import json
 import random
+import sys
+from collections import deque
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import json_codec
+from write_markers import is_write_command
+
 # -----------------------
 # Pools (edit as desired)
 # -----------------------
@@ -73,7 +80,8 @@ GROUPS   = ["CustomAdministratorAccessGroup", "DataScientists", "DevOps"]
 # Helpers
 # -----------------------
 def iso_z(dt: datetime) -> str:
-    return dt.replace(microsecond=0).isoformat() + "Z"
+    # timespec="seconds" drops microseconds while formatting, without building a new datetime
+    return dt.isoformat(timespec="seconds") + "Z"
 
 def maybe(p: float) -> bool:
     return random.random() < p
@@ -85,17 +93,34 @@ def failure(msg: str = "synthetic error") -> dict:
     return {"status": "error", "output": "", "error": msg}
 
 def deep_clone(x):
-    return json.loads(json.dumps(x))
-
-def pick_with_hotset(all_items, hotset_frac: float, hotset_weight: float):
+    # Events hold only dicts, lists and immutable scalars, so those scalars can be shared
+    t = type(x)
+    if t is dict:
+        return {k: deep_clone(v) for k, v in x.items()}
+    if t is list:
+        return [deep_clone(v) for v in x]
+    return x
+
+def hotset_picker(all_items, hotset_frac: float, hotset_weight: float):
+    """
+    Return a zero-argument picker over all_items that favours its first
+    hotset_frac items with probability hotset_weight. The hot/cold split is
+    taken once here; each pick rolls maybe(hotset_weight), then random.choice.
+    """
     n = max(1, int(len(all_items) * hotset_frac))
-    hot = all_items[:n]
-    cold = all_items[n:]
+    hot = tuple(all_items[:n])
+    cold = tuple(all_items[n:])
     if not cold:
-        return random.choice(hot)
-    if maybe(hotset_weight):
-        return random.choice(hot)
-    return random.choice(cold)
+        return lambda: random.choice(hot)
+
+    def pick():
+        if maybe(hotset_weight):
+            return random.choice(hot)
+        return random.choice(cold)
+    return pick
+
+def pick_with_hotset(all_items, hotset_frac: float, hotset_weight: float):
+    return hotset_picker(all_items, hotset_frac, hotset_weight)()
 
 def ctx(reasoning: str, description: str) -> dict:
     return {"reasoning": reasoning, "description": description}
@@ -103,73 +128,87 @@ def ctx(reasoning: str, description: str) -> dict:
 # -----------------------------------
 # Emitters (match your action shapes)
 # -----------------------------------
+# Outputs and contexts that never vary are built once and shared by every
+# event an emitter returns; events are only ever mutated at the top level
+# (timestamp), and duplicates go through deep_clone. Strings formatted per
+# event (commands, result messages) are interned so repeats share one object.
+_S3_LS_RESULT = success(
+    "2025-04-09 02:19:07 terraform-elk-stack-state\n"
+    "2025-06-14 18:31:27 terraform-state-demo-12db66cf\n"
+    "2024-12-04 04:13:55 test-bucket-dcc2aa3d\n"
+    "2025-05-19 04:09:28 test-index-codebase\n"
+    "2024-11-24 05:55:43 test-yja-org-dev-serverlessdeploymentbucket-w4j7wfhqhl1a\n"
+    "2025-06-22 18:49:38 thanos-metrics-dev-us-east-2-980921723213\n"
+    "2025-05-02 18:45:03 vikram-s3-testing-ohio-us-east-2"
+)
+_S3_LS_CTX = ctx("List all S3 buckets to understand current infrastructure",
+                 "Executing AWS S3 list command to inventory buckets")
+
 def em_execute_s3_ls(bucket: str) -> dict:
-    cmd = f"aws s3 ls --recursive s3://{bucket}"
-    out = (
-        f"2025-04-09 02:19:07 terraform-elk-stack-state\n"
-        f"2025-06-14 18:31:27 terraform-state-demo-12db66cf\n"
-        f"2024-12-04 04:13:55 test-bucket-dcc2aa3d\n"
-        f"2025-05-19 04:09:28 test-index-codebase\n"
-        f"2024-11-24 05:55:43 test-yja-org-dev-serverlessdeploymentbucket-w4j7wfhqhl1a\n"
-        f"2025-06-22 18:49:38 thanos-metrics-dev-us-east-2-980921723213\n"
-        f"2025-05-02 18:45:03 vikram-s3-testing-ohio-us-east-2"
-    )
+    cmd = sys.intern(f"aws s3 ls --recursive s3://{bucket}")
     return {
         "action_type": "execute_command",
         "action": {"command": cmd},
-        "result": success(out),
-        "context": ctx("List all S3 buckets to understand current infrastructure",
-                       "Executing AWS S3 list command to inventory buckets"),
+        "result": _S3_LS_RESULT,
+        "context": _S3_LS_CTX,
     }
 
+_IAM_GROUPS_RESULT = success(
+    '{\n    "Groups": [\n        {\n'
+    '            "GroupName": "CustomAdministratorAccessGroup",\n'
+    '            "GroupId": "AGPA6IY35VFGSH2AYBV64",\n'
+    '            "Arn": "arn:aws:iam::980921723213:group/CustomAdministratorAccessGroup",\n'
+    '            "CreateDate": "2025-06-15T18:43:50+00:00"\n'
+    "        }\n    ]\n}"
+)
+_IAM_GROUPS_CTX = ctx("Check IAM group membership for a user",
+                      "Retrieving IAM group information for user")
+
 def em_execute_iam_groups_for_user(user: str = "sritan-iam") -> dict:
-    cmd = f"aws iam list-groups-for-user --user-name {user}"
-    out = (
-        '{\n    "Groups": [\n        {\n'
-        '            "GroupName": "CustomAdministratorAccessGroup",\n'
-        '            "GroupId": "AGPA6IY35VFGSH2AYBV64",\n'
-        '            "Arn": "arn:aws:iam::980921723213:group/CustomAdministratorAccessGroup",\n'
-        '            "CreateDate": "2025-06-15T18:43:50+00:00"\n'
-        "        }\n    ]\n}"
-    )
+    cmd = sys.intern(f"aws iam list-groups-for-user --user-name {user}")
     return {
         "action_type": "execute_command",
         "action": {"command": cmd},
-        "result": success(out),
-        "context": ctx("Check IAM group membership for a user",
-                       "Retrieving IAM group information for user"),
+        "result": _IAM_GROUPS_RESULT,
+        "context": _IAM_GROUPS_CTX,
     }
 
+_IAM_POLICIES_BAD_RESULT = failure('/bin/sh: 1: Syntax error: "&&" unexpected')
+_IAM_POLICIES_BAD_CTX = ctx("List policies for group (first attempt, wrong quoting)",
+                            "Attempting to retrieve group policies with bad quoting")
+
 def em_execute_iam_list_policies_bad(group: str) -> dict:
     # malformed with &&
-    cmd = f'aws iam list-attached-group-policies --group-name {group} && echo "oops"'
+    cmd = sys.intern(f'aws iam list-attached-group-policies --group-name {group} && echo "oops"')
     return {
         "action_type": "execute_command",
         "action": {"command": cmd},
-        "result": failure('/bin/sh: 1: Syntax error: "&&" unexpected'),
-        "context": ctx("List policies for group (first attempt, wrong quoting)",
-                       "Attempting to retrieve group policies with bad quoting"),
+        "result": _IAM_POLICIES_BAD_RESULT,
+        "context": _IAM_POLICIES_BAD_CTX,
     }
 
+_IAM_POLICIES_OK_RESULT = success(
+    '{\n    "AttachedPolicies": [\n        {\n'
+    '            "PolicyName": "CustomAdministratorAccess",\n'
+    '            "PolicyArn": "arn:aws:iam::980921723213:policy/CustomAdministratorAccess"\n'
+    "        }\n    ]\n}"
+)
+_IAM_POLICIES_OK_CTX = ctx("Retry listing policies with proper quoting",
+                           "Successfully retrieved group policies")
+
 def em_execute_iam_list_policies_ok(group: str) -> dict:
-    cmd = f"aws iam list-attached-group-policies --group-name '{group}'"
-    out = (
-        '{\n    "AttachedPolicies": [\n        {\n'
-        '            "PolicyName": "CustomAdministratorAccess",\n'
-        '            "PolicyArn": "arn:aws:iam::980921723213:policy/CustomAdministratorAccess"\n'
-        "        }\n    ]\n}"
-    )
+    cmd = sys.intern(f"aws iam list-attached-group-policies --group-name '{group}'")
     return {
         "action_type": "execute_command",
         "action": {"command": cmd},
-        "result": success(out),
-        "context": ctx("Retry listing policies with proper quoting",
-                       "Successfully retrieved group policies"),
+        "result": _IAM_POLICIES_OK_RESULT,
+        "context": _IAM_POLICIES_OK_CTX,
     }
 
-def em_execute_iam_get_policy(acct: str, pol: str) -> dict:
+@functools.lru_cache(maxsize=None)
+def _iam_policy_parts(acct: str, pol: str) -> tuple:
+    # (arn, result, context) per account/policy pair; the pools are small
     arn = f"arn:aws:iam::{acct}:policy/{pol}"
-    cmd = f"aws iam get-policy --policy-arn {arn}"
     out = json.dumps({
         "Policy": {
             "PolicyName": pol,
@@ -185,62 +224,72 @@ def em_execute_iam_get_policy(acct: str, pol: str) -> dict:
             "Tags": []
         }
     }, indent=2)
+    return arn, success(out), ctx("Get detailed policy information",
+                                  f"Retrieved policy details for {pol}")
+
+def em_execute_iam_get_policy(acct: str, pol: str) -> dict:
+    arn, result, context = _iam_policy_parts(acct, pol)
+    cmd = sys.intern(f"aws iam get-policy --policy-arn {arn}")
     return {
         "action_type": "execute_command",
         "action": {"command": cmd},
-        "result": success(out),
-        "context": ctx("Get detailed policy information",
-                       f"Retrieved policy details for {pol}"),
+        "result": result,
+        "context": context,
+    }
+
+_ACCOUNT_SUMMARY_CMD = "aws iam get-account-summary"
+_ACCOUNT_SUMMARY_RESULT = success(json.dumps({
+    "SummaryMap": {
+        "GroupPolicySizeQuota": 5120,
+        "InstanceProfilesQuota": 1000,
+        "Policies": 73,
+        "GroupsPerUserQuota": 10,
+        "InstanceProfiles": 42,
+        "AttachedPoliciesPerUserQuota": 10,
+        "Users": 10,
+        "PoliciesQuota": 1500,
+        "Providers": 10,
+        "AccountMFAEnabled": 1,
+        "AccessKeysPerUserQuota": 2,
+        "AssumeRolePolicySizeQuota": 2048,
+        "PolicyVersionsInUseQuota": 10000,
+        "GlobalEndpointTokenVersion": 1,
+        "VersionsPerPolicyQuota": 5,
+        "AttachedPoliciesPerGroupQuota": 10,
+        "PolicySizeQuota": 6144,
+        "Groups": 10,
+        "AccountSigningCertificatesPresent": 0,
+        "UsersQuota": 5000,
+        "ServerCertificatesQuota": 20,
+        "MFADevices": 10,
+        "UserPolicySizeQuota": 2048,
+        "PolicyVersionsInUse": 133,
+        "ServerCertificates": 0,
+        "Roles": 237,
+        "RolesQuota": 1000,
+        "SigningCertificatesPerUserQuota": 2,
+        "MFADevicesInUse": 9,
+        "RolePolicySizeQuota": 10240,
+        "AttachedPoliciesPerRoleQuota": 10,
+        "AccountAccessKeysPresent": 1,
+        "AccountPasswordPresent": 1,
+        "GroupsQuota": 300
     }
+}, indent=2))
+_ACCOUNT_SUMMARY_CTX = ctx("Get AWS account summary to understand resource usage",
+                           "Retrieved comprehensive account summary")
 
 def em_execute_iam_account_summary() -> dict:
-    cmd = "aws iam get-account-summary"
-    out = json.dumps({
-        "SummaryMap": {
-            "GroupPolicySizeQuota": 5120,
-            "InstanceProfilesQuota": 1000,
-            "Policies": 73,
-            "GroupsPerUserQuota": 10,
-            "InstanceProfiles": 42,
-            "AttachedPoliciesPerUserQuota": 10,
-            "Users": 10,
-            "PoliciesQuota": 1500,
-            "Providers": 10,
-            "AccountMFAEnabled": 1,
-            "AccessKeysPerUserQuota": 2,
-            "AssumeRolePolicySizeQuota": 2048,
-            "PolicyVersionsInUseQuota": 10000,
-            "GlobalEndpointTokenVersion": 1,
-            "VersionsPerPolicyQuota": 5,
-            "AttachedPoliciesPerGroupQuota": 10,
-            "PolicySizeQuota": 6144,
-            "Groups": 10,
-            "AccountSigningCertificatesPresent": 0,
-            "UsersQuota": 5000,
-            "ServerCertificatesQuota": 20,
-            "MFADevices": 10,
-            "UserPolicySizeQuota": 2048,
-            "PolicyVersionsInUse": 133,
-            "ServerCertificates": 0,
-            "Roles": 237,
-            "RolesQuota": 1000,
-            "SigningCertificatesPerUserQuota": 2,
-            "MFADevicesInUse": 9,
-            "RolePolicySizeQuota": 10240,
-            "AttachedPoliciesPerRoleQuota": 10,
-            "AccountAccessKeysPresent": 1,
-            "AccountPasswordPresent": 1,
-            "GroupsQuota": 300
-        }
-    }, indent=2)
     return {
         "action_type": "execute_command",
-        "action": {"command": cmd},
-        "result": success(out),
-        "context": ctx("Get AWS account summary to understand resource usage",
-                       "Retrieved comprehensive account summary"),
+        "action": {"command": _ACCOUNT_SUMMARY_CMD},
+        "result": _ACCOUNT_SUMMARY_RESULT,
+        "context": _ACCOUNT_SUMMARY_CTX,
     }
 
+_CREATE_FILE_CTX = ctx("Create database configuration file for the application",
+                       "Created SQLAlchemy database configuration")
+
 def em_create_file(fp: str, body: str) -> dict:
     return {
         "action_type": "create_file",
@@ -248,13 +297,22 @@ def em_create_file(fp: str, body: str) -> dict:
             "file_path": fp,
             "content": body
         },
-        "result": success(f"Created file: {fp}"),
-        "context": ctx("Create database configuration file for the application",
-                       "Created SQLAlchemy database configuration"),
+        "result": success(sys.intern(f"Created file: {fp}")),
+        "context": _CREATE_FILE_CTX,
     }
 
+@functools.lru_cache(maxsize=None)
+def _mod_msg(files: tuple) -> str:
+    # memoized per file tuple, so repeated hotset edits share one message string
+    if len(files) == 1:
+        return "Modified file: " + files[0]
+    return "Modified file: " + ", ".join(files)
+
+_MODIFY_CODE_CTX = ctx("Enhance configuration with environment-based settings",
+                       "Added configuration helper function")
+
 def em_modify_code(files: list[str], code: str, instructions: str) -> dict:
-    files = sorted(files)
+    # files must already be sorted and unique (callers build them that way)
     return {
         "action_type": "modify_code",
         "action": {
@@ -262,40 +320,56 @@ def em_modify_code(files: list[str], code: str, instructions: str) -> dict:
             "instructions": instructions,
             "files": files
         },
-        "result": success(f"Modified file: {', '.join(files)}"),
-        "context": ctx("Enhance configuration with environment-based settings",
-                       "Added configuration helper function"),
+        "result": success(_mod_msg(tuple(files))),
+        "context": _MODIFY_CODE_CTX,
     }
 
+@functools.lru_cache(maxsize=None)
+def _read_file_ctx(fp: str) -> dict:
+    # one shared context per path
+    return ctx("Verify the file contents", f"Read and verified {fp} contents")
+
 def em_read_file(fp: str, contents: str) -> dict:
     return {
         "action_type": "read_file_contents",
         "action": {"file_path": fp},
         "result": success(contents),
-        "context": ctx("Verify the file contents", f"Read and verified {fp} contents"),
+        "context": _read_file_ctx(fp),
     }
 
+_QUERY_CODEBASE_CTX = ctx("Search for existing patterns in the codebase",
+                          "Searched codebase for database connection patterns")
+
 def em_query_codebase(q: str, lines: list[str]) -> dict:
     body = "Found 3 relevant code snippets related to database connection patterns:\n\n" + "\n".join(lines)
     return {
         "action_type": "query_codebase",
         "action": {"query": q},
         "result": success(body),
-        "context": ctx("Search for existing patterns in the codebase",
-                       "Searched codebase for database connection patterns"),
+        "context": _QUERY_CODEBASE_CTX,
     }
 
 # -----------------------
 # Sequence construction
 # -----------------------
+# Action types that always mutate their resources (never kept as recent reads)
+_WRITE_TYPES = frozenset({"create_file", "modify_code", "delete_file"})
+
+# Decision tables for the random fill, built once rather than per roll
+_WRITE_KINDS = ("create", "modify")
+_MODIFY_FILE_COUNTS = (1, 1, 2)
+_QUERY_HIT_LINES = (
+    "1. app/main.py - usage",
+    "2. infra/iam.tf - sample",
+    "3. app/config.py - config mgmt",
+)
+
 def looks_writey_exec(entry: dict) -> bool:
     if entry["action_type"] != "execute_command":
         return False
-    cmd = (entry["action"].get("command") or "").lower()
-    markers = [" create-", " put-", " attach-", " update-", " delete-", " remove-", " set-", " cp ", " mv ", " rm "]
-    return any(m in f" {cmd} " for m in markers)
+    return is_write_command(entry["action"].get("command") or "")
 
-def generate_trace(
+def iter_trace(
     n=50,
     dup_rate=0.25,
     write_rate=0.30,
@@ -309,15 +383,22 @@ def generate_trace(
     hotset_weight: float = 0.75,
     read_after_write_prob: float = 0.25,
 ):
+    """Yield up to n trace events in order, without holding the whole trace."""
     random.seed(seed)
     ts = start or datetime.utcnow()
     delta = timedelta(seconds=step_seconds)
 
-    events: list[dict] = []
+    emitted = 0
 
     # Seed a realistic AWS/IAM + code flow similar to your example
-    bucket = pick_with_hotset(BUCKETS, hotset_frac, hotset_weight)
-    grp    = pick_with_hotset(GROUPS, hotset_frac, hotset_weight)
+    # Hotset pickers for this run's pools, split once up front
+    pick_bucket = hotset_picker(BUCKETS, hotset_frac, hotset_weight)
+    pick_group  = hotset_picker(GROUPS, hotset_frac, hotset_weight)
+    pick_file   = hotset_picker(FILES, hotset_frac, hotset_weight)
+    pick_query  = hotset_picker(QUERIES, 0.7, 0.9)
+
+    bucket = pick_bucket()
+    grp    = pick_group()
     acct   = random.choice(ACCOUNTS)
     pol    = random.choice(POLICIES)
 
@@ -401,120 +482,158 @@ def generate_trace(
 
     # Timestamp & append the seeded flow
     for e in seed_flow:
+        if emitted >= n:
+            return
         e["timestamp"] = iso_z(ts)
         ts += delta
-        events.append(e)
+        yield e
+        emitted += 1
 
     # Buffer of recent successful READs for exact duplicates
-    recent_reads: list[dict] = []
+    # (the deque drops the oldest read once max_buf is reached)
     max_buf = 60
+    recent_reads: deque[dict] = deque(maxlen=max_buf)
 
     def consider_recent_read(e: dict):
         if e["result"]["status"] != "success":
             return
-        # Treat as READ if not a writey execute_command and not a write op
-        is_read = (e["action_type"] != "execute_command" or not looks_writey_exec(e)) and \
-                  e["action_type"] not in {"create_file", "modify_code", "delete_file"}
-        if is_read:
-            recent_reads.append(e)
-            if len(recent_reads) > max_buf:
-                recent_reads.pop(0)
+        # Treat as READ if not a write op and not a writey execute_command
+        action_type = e["action_type"]
+        if action_type in _WRITE_TYPES:
+            return
+        if action_type == "execute_command" and looks_writey_exec(e):
+            return
+        recent_reads.append(e)
 
     for e in seed_flow:
         consider_recent_read(e)
 
     # Fill the rest up to n
+    def read_file():
+        fp = pick_file()
+        body = random.choice(CODE_SNIPPETS)
+        return em_read_file(fp, body)
+
+    # One roll picks the read kind: s3_ls, iam_groups_user, iam_list_ok,
+    # iam_get_policy, account_summary, read_file, query_codebase
+    read_makers = (
+        lambda: em_execute_s3_ls(pick_bucket()),
+        lambda: em_execute_iam_groups_for_user("sritan-iam"),
+        lambda: em_execute_iam_list_policies_ok(pick_group()),
+        lambda: em_execute_iam_get_policy(random.choice(ACCOUNTS), random.choice(POLICIES)),
+        em_execute_iam_account_summary,
+        read_file,
+        lambda: em_query_codebase(pick_query(), _QUERY_HIT_LINES),
+    )
+
     def make_random_read():
         # bias toward the same resources for better cache hits
-        choice = random.choice(["s3_ls", "iam_groups_user", "iam_list_ok", "iam_get_policy",
-                                "account_summary", "read_file", "query_codebase"])
-        if choice == "s3_ls":
-            return em_execute_s3_ls(pick_with_hotset(BUCKETS, hotset_frac, hotset_weight))
-        if choice == "iam_groups_user":
-            return em_execute_iam_groups_for_user("sritan-iam")
-        if choice == "iam_list_ok":
-            return em_execute_iam_list_policies_ok(pick_with_hotset(GROUPS, hotset_frac, hotset_weight))
-        if choice == "iam_get_policy":
-            return em_execute_iam_get_policy(random.choice(ACCOUNTS), random.choice(POLICIES))
-        if choice == "account_summary":
-            return em_execute_iam_account_summary()
-        if choice == "read_file":
-            fp = pick_with_hotset(FILES, hotset_frac, hotset_weight)
-            body = random.choice(CODE_SNIPPETS)
-            return em_read_file(fp, body)
-        # query_codebase
-        q = pick_with_hotset(QUERIES, 0.7, 0.9)
-        return em_query_codebase(q, [
-            "1. app/main.py - usage",
-            "2. infra/iam.tf - sample",
-            "3. app/config.py - config mgmt",
-        ])
+        return random.choice(read_makers)()
 
     def make_random_write():
-        choice = random.choice(["create", "modify"])
-        if choice == "create":
-            fp = pick_with_hotset(FILES, hotset_frac, hotset_weight)
+        if random.choice(_WRITE_KINDS) == "create":
+            fp = pick_file()
             return em_create_file(fp, random.choice(CODE_SNIPPETS))
         # modify
-        k = random.choice([1, 1, 2])
-        files = sorted({pick_with_hotset(FILES, hotset_frac, hotset_weight) for _ in range(k)})
+        # k is 1 or 2, so the sorted, de-duplicated file list is built directly
+        if random.choice(_MODIFY_FILE_COUNTS) == 1:
+            files = [pick_file()]
+        else:
+            a = pick_file()
+            b = pick_file()
+            files = [a] if a == b else ([a, b] if a < b else [b, a])
         code = "# synthetic refactor\n" + random.choice(CODE_SNIPPETS) + "\n"
         return em_modify_code(files, code, "synthetic refactor")
 
     def make_random_error():
-        return em_execute_iam_list_policies_bad(pick_with_hotset(GROUPS, hotset_frac, hotset_weight))
+        return em_execute_iam_list_policies_bad(pick_group())
+
+    # Hot-loop globals bound to locals (LOAD_FAST instead of LOAD_GLOBAL)
+    _maybe, _iso_z, _deep_clone = maybe, iso_z, deep_clone
+    _randrange, _choice = random.randrange, random.choice
 
-    while len(events) < n:
+    while emitted < n:
         # error vs normal
-        if maybe(error_rate):
+        if _maybe(error_rate):
             e = make_random_error()
         else:
             # duplicate vs new
-            if recent_reads and maybe(dup_rate):
-                e = deep_clone(random.choice(recent_reads))  # exact duplicate → same tool_key
+            if recent_reads and _maybe(dup_rate):
+                e = _deep_clone(recent_reads[_randrange(len(recent_reads))])  # exact duplicate → same tool_key
             else:
-                if maybe(write_rate):
+                if _maybe(write_rate):
                     e = make_random_write()
                 else:
                     e = make_random_read()
 
-        e["timestamp"] = iso_z(ts)
+        e["timestamp"] = _iso_z(ts)
         ts += delta
-        events.append(e)
+        yield e
+        emitted += 1
 
         consider_recent_read(e)
 
         # burst of identical reads
-        if recent_reads and maybe(burst_prob) and len(events) < n:
-            src = deep_clone(random.choice(recent_reads))
+        if recent_reads and _maybe(burst_prob) and emitted < n:
+            # Copies share src's action/result/context; nothing mutates them after emission
+            src = recent_reads[_randrange(len(recent_reads))]
             for _ in range(burst_len - 1):
-                if len(events) >= n:
+                if emitted >= n:
                     break
-                b = deep_clone(src)
-                b["timestamp"] = iso_z(ts)
+                b = dict(src)  # only the timestamp differs
+                b["timestamp"] = _iso_z(ts)
                 ts += delta
-                events.append(b)
+                yield b
+                emitted += 1
                 consider_recent_read(b)
 
         # read-after-write to test invalidation
-        if e["result"]["status"] == "success" and maybe(read_after_write_prob) and len(events) < n:
+        if e["result"]["status"] == "success" and _maybe(read_after_write_prob) and emitted < n:
             ra = None
             if e["action_type"] == "create_file":
-                ra = em_read_file(e["action"]["file_path"], random.choice(CODE_SNIPPETS))
+                ra = em_read_file(e["action"]["file_path"], _choice(CODE_SNIPPETS))
             elif e["action_type"] == "modify_code":
                 fl = e["action"].get("files") or []
                 if fl:
-                    ra = em_read_file(random.choice(fl), random.choice(CODE_SNIPPETS))
+                    ra = em_read_file(_choice(fl), _choice(CODE_SNIPPETS))
             elif looks_writey_exec(e):
                 # not emitting a writey exec in this generator (kept simpler)
                 pass
             if ra:
-                ra["timestamp"] = iso_z(ts)
+                ra["timestamp"] = _iso_z(ts)
                 ts += delta
-                events.append(ra)
+                yield ra
+                emitted += 1
                 consider_recent_read(ra)
 
-    return events[:n]
+
+def generate_trace(*args, **kwargs) -> list[dict]:
+    """Generate the whole trace as a list; see iter_trace for the parameters."""
+    return list(iter_trace(*args, **kwargs))
+
+def write_trace_json(events, out_path: Path, pretty: bool = False) -> int:
+    """
+    Stream events to out_path as a JSON array, one event at a time.
+    Compact by default; with pretty=True the layout is json.dumps(..., indent=2)
+    (byte-identical for the ASCII-only events this generator emits, since orjson
+    writes non-ASCII characters raw where json.dumps escapes them). Returns the
+    event count.
+    """
+    count = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        for e in events:
+            if pretty:
+                # Event strings never contain raw newlines, so re-indenting by line is safe
+                f.write(("[\n  " if count == 0 else ",\n  ")
+                        + json_codec.dumps(e, indent=True).replace("\n", "\n  "))
+            else:
+                f.write(("[" if count == 0 else ",") + json_codec.dumps(e))
+            count += 1
+        if not count:
+            f.write("[]")
+        else:
+            f.write("\n]" if pretty else "]")
+    return count
 
 # -----------------------
 # CLI
@@ -533,12 +652,13 @@ def main():
     ap.add_argument("--hotset-frac", type=float, default=0.4)
     ap.add_argument("--hotset-weight", type=float, default=0.75)
     ap.add_argument("--read-after-write-prob", type=float, default=0.25)
+    ap.add_argument("--pretty", action="store_true", help="indent the output JSON (2 spaces)")
     args = ap.parse_args()
 
     random.seed(args.seed)
     start = datetime(2024, 1, 15, 10, 30, 0)  # deterministic-ish anchor like your example
 
-    trace = generate_trace(
+    events = iter_trace(
         n=args.n,
         dup_rate=args.dup_rate,
         write_rate=args.write_rate,
@@ -555,9 +675,8 @@ def main():
 
     out_path = Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    with out_path.open("w") as f:
-        json.dump(trace, f, indent=2)
-    print(f"Wrote {len(trace)} events to {out_path}")
+    count = write_trace_json(events, out_path, pretty=args.pretty)
+    print(f"Wrote {count} events to {out_path}")
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,21 @@
-from typing import List
-import tiktoken
+import functools
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    import tiktoken
+
+
+@functools.lru_cache(maxsize=1)
+def _get_encoder() -> "tiktoken.Encoding":
+    """
+    GPT-4o encoder, looked up once and shared by every TokenCounter.
+
+    tiktoken is imported here rather than at module level, so importing this
+    module stays cheap for code that never counts tokens.
+    """
+    import tiktoken
+
+    return tiktoken.encoding_for_model("gpt-4o")
 
 
 class TokenCounter:
@@ -15,16 +31,18 @@ class TokenCounter:
         Initialize the token counter with GPT-4o encoding.
 
         Sets up the tiktoken encoder using the GPT-4o model encoding
-        for consistent token counting across the application.
+        for consistent token counting across the application. The encoder
+        is shared process-wide, so extra instances are cheap.
         """
-        self.encoder = tiktoken.encoding_for_model("gpt-4o")
+        self.encoder = _get_encoder()
 
     def count_tokens(self, text: str) -> int:
         """
         Count the number of tokens in the given text.
 
         Uses the configured tiktoken encoder to determine the exact
-        number of tokens that would be used for the input text.
+        number of tokens that would be used for the input text. Special-token
+        strings are counted as ordinary text, skipping the special-token scan.
 
         Args:
             text (str): The text to count tokens for
@@ -32,4 +50,60 @@ class TokenCounter:
         Returns:
             int: Number of tokens in the text
         """
-        return len(self.encoder.encode(text))
+        return len(self.encoder.encode_ordinary(text))
+
+    def count_tokens_batch(self, texts: List[str], num_threads: int = 8) -> List[int]:
+        """
+        Count tokens for many texts in a single call.
+
+        Uses tiktoken's batch encoder, which tokenizes the texts in parallel
+        threads and amortizes the per-call overhead of count_tokens.
+
+        Args:
+            texts (List[str]): The texts to count tokens for
+            num_threads (int): Number of tokenizer threads to use
+
+        Returns:
+            List[int]: Number of tokens in each text, in input order
+        """
+        return [len(tokens) for tokens in self.encoder.encode_ordinary_batch(texts, num_threads=num_threads)]
+
+    def count_tokens_upto(self, text: str, cap: int, chunk_chars: int = 4096) -> int:
+        """
+        Count tokens until the count reaches cap, for "is this over budget?" checks.
+
+        Encodes the text in chunks of chunk_chars characters and stops at the
+        first chunk that brings the total to cap or more, so long texts over
+        the limit are never fully tokenized. Chunk boundaries can split a
+        token, so the result may slightly overcount compared to count_tokens.
+
+        Args:
+            text (str): The text to count tokens for
+            cap (int): Count at which counting stops
+            chunk_chars (int): Characters encoded per step
+
+        Returns:
+            int: Token count, or a count >= cap once the cap is reached
+        """
+        total = 0
+        for start in range(0, len(text), chunk_chars):
+            total += len(self.encoder.encode_ordinary(text[start:start + chunk_chars]))
+            if total >= cap:
+                break
+        return total
+
+    @staticmethod
+    def approx(text: str) -> int:
+        """
+        Cheap token estimate of about 4 characters per token, without tokenizing.
+
+        Meant as a first-level filter for budget checks: only texts whose
+        estimate is near the limit need an exact count_tokens call.
+
+        Args:
+            text (str): The text to estimate tokens for
+
+        Returns:
+            int: Estimated number of tokens
+        """
+        return (len(text) + 3) // 4
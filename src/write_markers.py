@@ -0,0 +1,22 @@
+import re
+
+# Command substrings that mark an execute_command as a write, shared by the
+# reuse cache's read/write classification and the synthetic trace generator
+WRITE_MARKERS = (
+    " create-", " put-", " attach-", " update-", " delete-",
+    " remove-", " set-", " cp ", " mv ", " rm ",
+)
+_WRITE_RE = re.compile("|".join(re.escape(marker) for marker in WRITE_MARKERS))
+
+
+def is_write_command(command: str) -> bool:
+    """
+    Whether a shell command mutates its resources, matched in one regex pass.
+
+    Args:
+        command (str): Command line as executed
+
+    Returns:
+        bool: True if the command contains any of WRITE_MARKERS (case-insensitive)
+    """
+    return _WRITE_RE.search(f" {command.lower()} ") is not None
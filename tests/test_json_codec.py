@@ -0,0 +1,29 @@
+import json
+
+import pytest
+
+import json_codec
+
+
+def _stdlib_canonical(obj):
+    return json.dumps(obj, sort_keys=True, separators=(",", ":")).encode()
+
+
+@pytest.mark.parametrize("code", range(0x80))
+def test_dumps_canonical_matches_stdlib_for_ascii(code):
+    obj = {"b": chr(code), "a": [f"x{chr(code)}y", 1, None, True]}
+    assert json_codec.dumps_canonical(obj) == _stdlib_canonical(obj)
+
+
+@pytest.mark.parametrize(
+    "obj",
+    [
+        {"path": "/tmp/a\x7fb", "n": 3},
+        {"cmd": "echo \x00\x1f\t\n\r", "args": ["\x7f"]},
+        {"text": "café ☃ \U0001f600"},
+        {"ratio": 1e-7, "big": 1e21, "x": 0.1},
+        {"z": {"y": {"x": [1, 2, {"w": "v"}]}}, "a": ""},
+    ],
+)
+def test_dumps_canonical_matches_stdlib(obj):
+    assert json_codec.dumps_canonical(obj) == _stdlib_canonical(obj)
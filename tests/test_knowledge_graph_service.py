@@ -0,0 +1,225 @@
+import copy
+import json
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+pytest.importorskip("neo4j")
+pytest.importorskip("langchain_openai")
+
+import knowledge_graph_service as kgs
+from knowledge_graph_service import KnowledgeGraphService, _canonical_ts
+from synthetic_data_generator import generate_trace
+
+EXAMPLE_TRACE = Path(__file__).resolve().parent.parent / "examples" / "tool_execution_trace.json"
+
+
+class FakeNeo4jService:
+    """In-memory stand-in for the Neo4jService queries used by ingestion and reuse"""
+
+    def __init__(self):
+        self.nodes: Dict[str, Dict] = {}
+        self.counters: Dict[str, int] = {}
+
+    def close(self):
+        pass
+
+    def _in_workflow(self, workflow_id: str) -> List[Dict]:
+        return [n for n in self.nodes.values() if n["workflow_id"] == workflow_id]
+
+    def update_nodes_bulk(self, nodes: List[Dict], workflow_id: str):
+        for row in nodes:
+            node = self.nodes.setdefault(row["id"], {"id": row["id"]})
+            node.update(summary=row["summary"], content=row["content"], workflow_id=workflow_id)
+            node.update(row.get("properties") or {})
+
+    def delete_nodes(self, workflow_id: str, metadatas: List[str]):
+        for node_id in metadatas:
+            if self.nodes.get(node_id, {}).get("workflow_id") == workflow_id:
+                del self.nodes[node_id]
+
+    def get_node_by_metadata(self, workflow_id: str, metadata: str):
+        node = self.nodes.get(metadata)
+        return dict(node) if node and node["workflow_id"] == workflow_id else None
+
+    def get_nodes_by_metadatas(self, workflow_id: str, metadatas: List[str]) -> Dict[str, Dict]:
+        found = (self.get_node_by_metadata(workflow_id, node_id) for node_id in metadatas)
+        return {node["id"]: node for node in found if node}
+
+    def get_nodes_missing_property(self, workflow_id: str, prefix: str, key: str) -> List[Dict]:
+        return [dict(n) for n in self._in_workflow(workflow_id)
+                if n["id"].startswith(prefix) and n.get(key) is None]
+
+    def get_tool_counter(self, workflow_id: str):
+        return self.counters.get(workflow_id)
+
+    def get_max_counter_by_prefix(self, workflow_id: str, prefix: str) -> int:
+        return max((n["counter"] for n in self._in_workflow(workflow_id) if n["id"].startswith(prefix)), default=0)
+
+    def increment_tool_counter(self, workflow_id: str, count: int = 1, initial: int = 0) -> int:
+        self.counters[workflow_id] = self.counters.get(workflow_id, initial) + count
+        return self.counters[workflow_id]
+
+    def get_latest_successful_by_tool_keys(self, workflow_id: str, tool_keys: List[str]) -> Dict[str, Dict]:
+        latest = {}
+        for node in self._in_workflow(workflow_id):
+            key = node.get("tool_key")
+            if key in tool_keys and str(node.get("status")).lower() == "success":
+                if key not in latest or node["timestamp"] > latest[key]["timestamp"]:
+                    latest[key] = {"id": node["id"], "timestamp": node["timestamp"]}
+        return latest
+
+    def get_successful_nodes_by_resources(self, workflow_id: str, resource_ids: List[str],
+                                          action_types: List[str]) -> List[Dict]:
+        return [
+            {"id": n["id"], "timestamp": n["timestamp"]}
+            for n in self._in_workflow(workflow_id)
+            if n.get("action_type") in action_types
+            and str(n.get("status")).lower() == "success"
+            and set(n.get("resource_ids") or []) & set(resource_ids)
+        ]
+
+
+class FakeTokenCounter:
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def count_tokens_batch(self, texts: List[str], num_threads: int = 8) -> List[int]:
+        return [self.count_tokens(text) for text in texts]
+
+
+class FakeLLMService:
+    def __init__(self, api_key=None):
+        pass
+
+
+@pytest.fixture
+def make_service(monkeypatch):
+    monkeypatch.setattr(kgs, "Neo4jService", FakeNeo4jService)
+    monkeypatch.setattr(kgs, "TokenCounter", FakeTokenCounter)
+    monkeypatch.setattr(kgs, "LLMService", FakeLLMService)
+    return lambda: KnowledgeGraphService("test-workflow")
+
+
+def _traces():
+    example = json.loads(EXAMPLE_TRACE.read_text())
+    return [pytest.param(example, id="example")] + [
+        pytest.param(generate_trace(n=200, seed=seed), id=f"synthetic-{seed}") for seed in (1, 7, 42)
+    ]
+
+
+def _ingest_sequential(kg: KnowledgeGraphService, entries: List[Dict]) -> List[str]:
+    """preflight + add_tool_result one entry at a time; the tool ID each entry ends up with"""
+    tool_ids = []
+    for entry in entries:
+        action_type = entry.get("action_type", "unknown")
+        action = entry.get("action", {}) or {}
+        cached = None
+        if kg._classify_op(action_type, action) == "read":
+            cached = kg.preflight(action_type, action)
+        tool_ids.append(cached["tool_id"] if cached else kg.add_tool_result(entry))
+    return tool_ids
+
+
+def _ingest_planned(kg: KnowledgeGraphService, entries: List[Dict], batch_size: int) -> List[str]:
+    """plan_reuse + add_tool_results_bulk per batch, as demo_compression.ingest_batch does"""
+    tool_ids: List[str] = []
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        plan, fields = kg.plan_reuse(batch)
+        misses = [i for i, cached in enumerate(plan) if cached is None]
+        stored = dict(zip(misses, kg.add_tool_results_bulk([batch[i] for i in misses],
+                                                           [fields[i] for i in misses])))
+        batch_ids = []
+        for i, cached in enumerate(plan):
+            if cached is None:
+                batch_ids.append(stored[i])
+            elif "source_index" in cached:
+                batch_ids.append(batch_ids[cached["source_index"]])
+            else:
+                batch_ids.append(cached["tool_id"])
+        tool_ids.extend(batch_ids)
+    return tool_ids
+
+
+@pytest.mark.parametrize("entries", _traces())
+@pytest.mark.parametrize("batch_size", [1, 7, 500])
+def test_planned_bulk_ingest_matches_sequential(make_service, entries, batch_size):
+    timestamps = [entry["timestamp"] for entry in entries]
+    assert timestamps == sorted(timestamps), "plan_reuse assumes non-decreasing timestamps"
+
+    sequential = make_service()
+    expected_ids = _ingest_sequential(sequential, copy.deepcopy(entries))
+    planned = make_service()
+    actual_ids = _ingest_planned(planned, copy.deepcopy(entries), batch_size)
+
+    assert actual_ids == expected_ids
+    assert planned.neo4j_service.nodes == sequential.neo4j_service.nodes
+
+
+def _entry(action_type: str, action: Dict, timestamp: str) -> Dict:
+    return {"action_type": action_type, "action": action, "timestamp": timestamp,
+            "result": {"status": "success", "output": "ok"}}
+
+
+def test_recall_hit_survives_unrelated_writes(make_service):
+    kg = make_service()
+    kg._remember_hit("read:key", {"tool_id": "TR-1", "timestamp": "2024-01-15T10:30:00Z"},
+                     "cached line", ["/src/app.py"])
+
+    kg.add_tool_result(_entry("create_file", {"file_path": "/src/other.py", "content": ""},
+                              "2024-01-15T10:31:00Z"))
+
+    remembered = kg._recall_hit("read:key")
+    assert remembered is not None and remembered["tool_id"] == "TR-1"
+    # Re-validated at the current epoch, so the next recall skips the resource check
+    assert remembered["epoch"] == kg._write_epoch
+
+
+def test_recall_hit_dropped_after_newer_write_to_its_resource(make_service):
+    kg = make_service()
+    kg._remember_hit("read:key", {"tool_id": "TR-1", "timestamp": "2024-01-15T10:30:00Z"},
+                     "cached line", ["/src/app.py"])
+
+    kg.add_tool_result(_entry("create_file", {"file_path": "/src/app.py", "content": ""},
+                              "2024-01-15T10:31:00Z"))
+
+    assert kg._recall_hit("read:key") is None
+    assert "read:key" not in kg._preflight_cache
+
+
+def test_recall_hit_kept_after_older_write_to_its_resource(make_service):
+    kg = make_service()
+    kg._remember_hit("read:key", {"tool_id": "TR-1", "timestamp": "2024-01-15T10:30:00Z"},
+                     "cached line", ["/src/app.py"])
+
+    kg.add_tool_result(_entry("create_file", {"file_path": "/src/app.py", "content": ""},
+                              "2024-01-15T10:29:00Z"))
+
+    assert kg._recall_hit("read:key") is not None
+
+
+@pytest.mark.parametrize(
+    "ts, expected",
+    [
+        ("2024-01-15T10:30:00.000000Z", "2024-01-15T10:30:00.000000Z"),
+        ("2024-01-15T10:30:00Z", "2024-01-15T10:30:00.000000Z"),
+        ("2024-01-15T10:30:00.123456Z", "2024-01-15T10:30:00.123456Z"),
+        ("2024-01-15T10:30:00.5Z", "2024-01-15T10:30:00.500000Z"),
+        ("2024-01-15T12:30:00+02:00", "2024-01-15T10:30:00.000000Z"),
+        ("2024-01-15T00:30:00-01:00", "2024-01-15T01:30:00.000000Z"),
+        ("", ""),
+        (None, ""),
+        ("not a timestamp", ""),
+    ],
+)
+def test_canonical_ts(ts, expected):
+    assert _canonical_ts(ts) == expected
+
+
+def test_canonical_ts_orders_as_strings():
+    stamps = ["2024-01-15T10:30:00Z", "2024-01-15T10:30:00.5Z", "2024-01-15T12:31:00+02:00",
+              "2024-01-15T10:31:00.000001Z"]
+    canonical = [_canonical_ts(ts) for ts in stamps]
+    assert canonical == sorted(canonical)
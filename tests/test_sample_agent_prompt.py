@@ -0,0 +1,18 @@
+import string
+
+from sample_agent_prompt import PROMPT, render
+
+
+def _context():
+    fields = {field for _, field, _, _ in string.Formatter().parse(PROMPT) if field is not None}
+    return {field: f"<{field} with {{braces}} and 42>" for field in fields}
+
+
+def test_render_matches_format():
+    context = _context()
+    assert render(**context) == PROMPT.format(**context)
+
+
+def test_render_stringifies_values():
+    context = {field: [1, {"a": None}] for field in _context()}
+    assert render(**context) == PROMPT.format(**context)
@@ -0,0 +1,41 @@
+import pytest
+
+from token_counter import TokenCounter
+
+
+@pytest.fixture(scope="module")
+def counter():
+    pytest.importorskip("tiktoken")
+    return TokenCounter()
+
+
+def test_count_tokens_upto_short_text_is_exact(counter):
+    text = "Successfully listed 3 S3 buckets in us-west-2"
+    assert counter.count_tokens_upto(text, cap=1000) == counter.count_tokens(text)
+
+
+def test_count_tokens_upto_stops_once_cap_is_reached(counter):
+    text = "aws s3api list-buckets --region us-west-2\n" * 5000
+    cap = 100
+    count = counter.count_tokens_upto(text, cap, chunk_chars=256)
+    assert cap <= count < counter.count_tokens(text)
+
+
+def test_count_tokens_upto_under_cap_counts_whole_text(counter):
+    text = "terraform plan -out=tfplan\n" * 1000
+    chunk_chars = 4096
+    exact = counter.count_tokens(text)
+    count = counter.count_tokens_upto(text, cap=exact + 1000, chunk_chars=chunk_chars)
+    # Chunk boundaries can split a token, so allow a small overcount per boundary
+    assert exact <= count <= exact + 2 * (len(text) // chunk_chars)
+
+
+@pytest.mark.parametrize("text, expected", [("", 0), ("a", 1), ("abcd", 1), ("abcde", 2), ("x" * 4000, 1000)])
+def test_approx_is_four_chars_per_token(text, expected):
+    assert TokenCounter.approx(text) == expected
+
+
+def test_approx_is_near_exact_count_for_tool_output(counter):
+    text = '{"status": "success", "output": "Created bucket my-app-logs in us-west-2"}\n' * 50
+    exact = counter.count_tokens(text)
+    assert exact / 2 <= TokenCounter.approx(text) <= exact * 2